@@ -0,0 +1,131 @@
+"""/ask against a local OpenAI stub: coalescing, cache hits and event loop stalls
+
+Run from backend/:  python -m benchmarks.bench_ask_cache [concurrent_requests]
+Starts benchmarks.stub_openai on a free port, points the API at it through
+OPENAI_BASE_URL and indexes a throwaway git repository.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+
+from benchmarks import stub_openai
+
+STUB_DELAY = 0.5
+
+SAMPLE_SOURCE = '''
+def fetch_user(user_id):
+    """Load a user record from the database"""
+    return db.get(user_id)
+
+
+class Session:
+    """HTTP session with retries"""
+
+    def request(self, method, url):
+        return self.transport.send(method, url)
+'''
+
+
+def start_stub():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    stub_openai.app.state.delay = STUB_DELAY
+    server = uvicorn.Server(uvicorn.Config(stub_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, port
+
+
+def make_repository(root: str):
+    repo = os.path.join(root, "sample")
+    os.makedirs(repo)
+    with open(os.path.join(repo, "app.py"), "w") as f:
+        f.write(SAMPLE_SOURCE)
+    for command in (["init", "-q"], ["add", "."], ["-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "init"]):
+        subprocess.run(["git", *command], cwd=repo, check=True)
+    return repo
+
+
+def measure(concurrent_requests: int):
+    server, port = start_stub()
+    backend_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_ask_") as workdir:
+        repo = make_repository(workdir)
+
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        # main keeps its checkouts and databases under the working directory
+        sys.path.insert(0, backend_dir)
+        os.chdir(workdir)
+        try:
+            import main
+            from fastapi.testclient import TestClient
+
+            with TestClient(main.app) as client:
+                repo_id = client.post("/repositories", json={"github_url": repo}).json()["repo_id"]
+                while client.get(f"/repositories/{repo_id}").json()["status"] not in ("ready", "error"):
+                    time.sleep(0.05)
+
+                def ask(question):
+                    started = time.perf_counter()
+                    body = client.post(f"/repositories/{repo_id}/ask", json={"question": question}).json()
+                    return time.perf_counter() - started, body.get("cache")
+
+                # Identical questions at once share one upstream call
+                started = time.perf_counter()
+                with ThreadPoolExecutor(concurrent_requests) as pool:
+                    burst = list(pool.map(ask, ["How are users loaded?"] * concurrent_requests))
+                burst_seconds = time.perf_counter() - started
+                burst_calls = stub_openai.app.state.calls
+
+                # Differently phrased copies of a cached question
+                hit_seconds, hit_status = ask("  how are USERS loaded ")
+
+                # Other requests keep being served while a completion is pending
+                with ThreadPoolExecutor(1) as pool:
+                    pending = pool.submit(ask, "What does Session.request do?")
+                    time.sleep(0.05)
+                    started = time.perf_counter()
+                    client.get(f"/repositories/{repo_id}")
+                    status_seconds = time.perf_counter() - started
+                    pending.result()
+
+                cache_stats = client.get("/debug/repositories").json()["answer_cache"]
+        finally:
+            # Leave the directory before it is removed
+            os.chdir(backend_dir)
+            server.should_exit = True
+
+    return {
+        "stub_delay_seconds": STUB_DELAY,
+        "concurrent_requests": concurrent_requests,
+        "burst_seconds": round(burst_seconds, 3),
+        "burst_upstream_calls": burst_calls,
+        "burst_cache_status": {status: sum(1 for _, s in burst if s == status) for status in ("miss", "coalesced", "hit")},
+        "cached_answer_ms": round(hit_seconds * 1000, 2),
+        "cached_answer_status": hit_status,
+        "status_request_during_completion_ms": round(status_seconds * 1000, 2),
+        "answer_cache": cache_stats,
+    }
+
+
+if __name__ == "__main__":
+    concurrent_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # Keep server progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(concurrent_requests)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
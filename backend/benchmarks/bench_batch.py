@@ -0,0 +1,118 @@
+"""Batch ingest of a synthetic repository and its forks, and search across them
+
+Run from backend/:  python -m benchmarks.bench_batch [--forks N] [--changed-files N] [--files N] [--output result.json]
+Accepts every benchmarks.synthetic_repo flag. Each fork is a clone of the
+synthetic repository with a few source files edited, and the original plus
+its forks go through one POST /repositories/batch. The result shows how many
+files were parsed versus shared or served from the parse cache, how many
+distinct parse results the repository store keeps for all of their files,
+and the latency of /search over the whole batch.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import latency
+from benchmarks.synthetic_repo import generate_repository, spec_arguments, spec_from_arguments
+
+
+def make_fork(origin: str, fork: str, changed_files: int, rng):
+    """Clone origin to fork and commit an extra function in changed_files of its Python files"""
+    subprocess.run(["git", "clone", "-q", origin, fork], check=True)
+    tracked = subprocess.run(["git", "ls-files", "*.py"], cwd=fork, capture_output=True, text=True, check=True)
+    for number, path in enumerate(rng.sample(tracked.stdout.split(), changed_files)):
+        with open(os.path.join(fork, path), 'a') as f:
+            f.write(f"\n\ndef fork_{os.path.basename(fork)}_{number}():\n    return {number}\n")
+    subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qam", "fork"],
+        cwd=fork, check=True
+    )
+
+
+def measure(spec, forks: int, changed_files: int, queries: int):
+    with tempfile.TemporaryDirectory(prefix="bench_batch_") as workdir:
+        rng = random.Random(spec.seed)
+        origin = os.path.join(workdir, "origin")
+        repository = generate_repository(origin, spec)
+        urls = [origin]
+        for number in range(forks):
+            urls.append(os.path.join(workdir, f"fork{number}"))
+            make_fork(origin, urls[-1], changed_files, rng)
+
+        sys.path.insert(0, os.getcwd())
+        import main
+        from fastapi.testclient import TestClient
+        from services.app_services import Settings
+
+        repos_dir = os.path.join(workdir, "repos")
+        app = main.create_app(Settings(repos_dir=repos_dir, job_workers=len(urls), parse_job_workers=len(urls)))
+        with TestClient(app) as client:
+            started = time.perf_counter()
+            batch = client.post("/repositories/batch", json={"repositories": [{"github_url": url} for url in urls]}).json()
+            while not (status := client.get(f"/batches/{batch['batch_id']}").json())["done"]:
+                time.sleep(0.01)
+            ingest_seconds = time.perf_counter() - started
+
+            names = [result["name"] for result in client.get(
+                "/search", params={"q": "_", "batch_id": batch["batch_id"], "limit": 200}
+            ).json()["results"]]
+            samples = []
+            for _ in range(queries):
+                started = time.perf_counter()
+                client.get("/search", params={"q": rng.choice(names), "batch_id": batch["batch_id"]})
+                samples.append(time.perf_counter() - started)
+            stored = client.get("/debug/repositories").json()["stored_content"]
+
+        connection = sqlite3.connect(os.path.join(repos_dir, "repositories.sqlite"))
+        stored_bytes = connection.execute("SELECT SUM(LENGTH(data)) FROM parsed_content").fetchone()[0]
+        connection.close()
+
+    return {
+        "benchmark": "batch",
+        "spec": spec._asdict(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "repository": repository,
+        "repositories": len(urls),
+        "changed_files_per_fork": changed_files,
+        "status_counts": status["status_counts"],
+        "ingest_seconds": round(ingest_seconds, 3),
+        # Files parsed, taken from a concurrent job and served from the parse cache
+        "parse": status["parse_cache"],
+        # File rows of all repositories against the distinct results stored for them
+        "stored": {**stored, "parsed_content_bytes": stored_bytes},
+        "search": latency(samples),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch ingest of forks and cross-repository search")
+    spec_arguments(parser)
+    parser.add_argument('--forks', type=int, default=4)
+    parser.add_argument('--changed-files', type=int, default=5, help="Python files edited in each fork")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--output', help="Also write the result to this file")
+    args = parser.parse_args()
+
+    # Keep progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(spec_from_arguments(args), args.forks, args.changed_files, args.queries)
+        finally:
+            sys.stdout = stdout
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,59 @@
+"""Resident memory of parsed elements: list of dicts vs ElementStore
+
+Run from backend/:  python -m benchmarks.bench_element_store [repo_path]
+Defaults to the running interpreter's standard library as a large corpus.
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+from parsers.code_parser import CodeParser
+from services.element_store import ElementStore
+
+
+def measure(repo_path: str):
+    parser = CodeParser()
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    elements = parser.parse_repository(repo_path)
+    gc.collect()
+    dict_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # Rebuild from scratch so the store owns every string it keeps
+    del elements
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    store = ElementStore(repo_path)
+    for parsed_file in parser.iter_parse_repository(repo_path):
+        store.extend(parsed_file.elements)
+    gc.collect()
+    store_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return {
+        "repo_path": repo_path,
+        "elements": len(store),
+        "dict_bytes": dict_bytes,
+        "store_bytes": store_bytes,
+        "bytes_per_element_dict": round(dict_bytes / max(1, len(store)), 1),
+        "bytes_per_element_store": round(store_bytes / max(1, len(store)), 1),
+        "reduction": round(dict_bytes / max(1, store_bytes), 2),
+    }
+
+
+if __name__ == "__main__":
+    repo_path = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.__file__)
+    # Keep parser progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(repo_path)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,110 @@
+"""JavaScript extraction on pathological long lines: old per-line regexes vs the scanner
+
+Run from backend/:  python -m benchmarks.bench_js_scanner [max_line_length]
+The scanner is timed directly, without the minified-file skip, so the
+numbers show its worst case rather than the heuristic bailing out.
+"""
+import json
+import os
+import sys
+import time
+
+from parsers.code_parser import CodeParser
+from parsers.js_scanner import scan_js_source
+
+NORMAL_MODULE = '''
+/** Sum the values of a list. */
+export function total(values) {
+  return values.reduce((sum, value) => sum + value, 0);
+}
+
+export class Cart {
+  constructor(items) {
+    this.items = items;
+  }
+
+  async checkout(client) {
+    const price = total(this.items.map(item => item.price));
+    return client.charge({ price: price, currency: "EUR" });
+  }
+}
+
+const double = x => x * 2;
+'''
+
+
+def pathological_inputs(line_length: int):
+    """Sources, mostly single-line, that make backtracking patterns go quadratic"""
+    return {
+        # `name = ... =>` retries `.*` from every identifier
+        "assignments_without_arrow": ("a = b + c; " * (line_length // 11)),
+        # One huge identifier: `(\w+)` restarts at every character
+        "long_identifier_assignment": ("x" * line_length + " = 1;"),
+        # Minified arrow soup on one line
+        "minified_arrows": ("n=e=>e+1,r=(t,o)=>t(o)," * (line_length // 24)),
+        # Unbalanced parentheses defeat parameter lists
+        "open_parens": ("f(" * (line_length // 2)),
+        # Indented modifier-only lines: a modifier list that crossed newlines rescanned every following line
+        "modifier_lines": ("  static\n" * (line_length // 9)),
+        # `import` then blank lines: a clause that could start or end in whitespace retried every split of it
+        "import_newlines": ("import" + "\n" * line_length),
+    }
+
+
+def scan_with_references(content, relative_path):
+    """The scanner as the parser runs it, with the import and reference scan"""
+    return scan_js_source(content, relative_path, references={'imports': [], 'references': []})
+
+
+def time_call(parse, content, repeat: int = 3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        elements = parse(content, "bench.js")
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(elements)
+
+
+def measure(max_line_length: int):
+    parser = CodeParser()
+    results = {}
+
+    normal = NORMAL_MODULE * 500
+    regex_seconds, regex_elements = time_call(parser.parse_js_regex, normal)
+    scan_seconds, scan_elements = time_call(scan_js_source, normal)
+    results["normal_module"] = {
+        "bytes": len(normal),
+        "regex_seconds": round(regex_seconds, 4),
+        "regex_elements": regex_elements,
+        "scanner_seconds": round(scan_seconds, 4),
+        "scanner_elements": scan_elements,
+        "speedup": round(regex_seconds / scan_seconds, 2),
+    }
+
+    line_length = 1000
+    while line_length <= max_line_length:
+        for name, content in pathological_inputs(line_length).items():
+            regex_seconds, _ = time_call(parser.parse_js_regex, content, repeat=1)
+            scan_seconds, _ = time_call(scan_with_references, content, repeat=1)
+            results[f"{name}_{line_length}"] = {
+                "bytes": len(content),
+                "regex_seconds": round(regex_seconds, 4),
+                "scanner_seconds": round(scan_seconds, 4),
+                "speedup": round(regex_seconds / max(scan_seconds, 1e-9), 1),
+            }
+        line_length *= 4
+
+    return results
+
+
+if __name__ == "__main__":
+    max_line_length = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    # Keep parser progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(max_line_length)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
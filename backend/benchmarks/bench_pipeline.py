@@ -0,0 +1,206 @@
+"""Clone, walk, parse, index and serve a synthetic repository, stage by stage
+
+Run from backend/:  python -m benchmarks.bench_pipeline [--files N] [--output result.json]
+Accepts every benchmarks.synthetic_repo flag. Each stage is timed on its own,
+then run again under tracemalloc for its peak Python memory, so tracing does
+not skew the throughput. Search, stats, usages and graph latencies go through
+FastAPI's test client against the same repository. Compare two runs with benchmarks.compare.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_repo import generate_repository, spec_arguments, spec_from_arguments
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def latency(samples):
+    return {
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+
+def run_stage(run, repeat_traced=True):
+    """Return (result, seconds, peak traced bytes) of run()"""
+    if not repeat_traced:
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, seconds, peak
+
+    started = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - started
+    del result
+    tracemalloc.start()
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def stage_result(seconds, peak, **counts):
+    result = {"seconds": round(seconds, 3), "peak_bytes": peak}
+    for name, count in counts.items():
+        result[name] = count
+        result[f"{name}_per_second"] = round(count / seconds, 1) if seconds else None
+    return result
+
+
+def measure_stages(repo, parse_workers):
+    from parsers.code_parser import PARSED_EXTENSIONS, CodeParser
+    from services.element_store import ElementStore
+    from services.repo_service import RepositoryService
+    from services.repository_store import ParsedRepository
+
+    stages = {}
+    repo_service = RepositoryService(depth=1)
+    clone, seconds, peak = run_stage(lambda: repo_service.clone_repository(repo), repeat_traced=False)
+    repo_path = clone["repo_path"]
+    stages["clone"] = stage_result(seconds, peak)
+
+    def walk():
+        records = repo_service.walk_repository(repo_path)
+        return records, repo_service.get_file_structure(repo_path, records)
+    (records, _), seconds, peak = run_stage(walk)
+    stages["walk"] = stage_result(seconds, peak, files=len(records), bytes=sum(record.size for record in records))
+
+    parser = CodeParser(workers=parse_workers)
+    source_bytes = sum(record.size for record in records if record.extension in PARSED_EXTENSIONS)
+    parsed_files, seconds, peak = run_stage(lambda: list(parser.iter_parse_repository(repo_path, records)))
+    elements = sum(len(parsed_file.elements) for parsed_file in parsed_files)
+    stages["parse"] = stage_result(seconds, peak, files=len(parsed_files), bytes=source_bytes, elements=elements)
+    parser.close()
+
+    def index():
+        parsed = ParsedRepository.create(ElementStore(repo_path))
+        for parsed_file in parsed_files:
+            if parsed_file.elements:
+                parsed.elements.add_file(parsed_file.record.relative_path, parsed_file.line_offsets)
+            parsed.add(parsed_file.elements)
+            if parsed_file.references is not None:
+                parsed.references.add_file(parsed_file.record.relative_path, parsed_file.references)
+        parsed.references.graph()
+        return parsed
+    parsed, seconds, peak = run_stage(index)
+    stages["index"] = stage_result(seconds, peak, elements=len(parsed.elements), references=len(parsed.references))
+    stages["index"]["resident_bytes"] = parsed.memory_usage()
+    return stages, parsed.elements.column('name')
+
+
+def measure_endpoints(repo, names, queries, rng):
+    # main keeps its checkouts and databases under the working directory
+    import main
+    from fastapi.testclient import TestClient
+
+    endpoints = {}
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        repo_id = client.post("/repositories", json={"github_url": repo}).json()["repo_id"]
+        while client.get(f"/repositories/{repo_id}").json()["status"] not in ("ready", "error"):
+            time.sleep(0.01)
+        endpoints["ingest_seconds"] = round(time.perf_counter() - started, 3)
+
+        # Exact names, name prefixes and words that mostly occur only in code
+        terms = [rng.choice(names) for _ in range(queries)]
+        terms = [term if i % 3 == 0 else term[:4] if i % 3 == 1 else term.split('_')[-1] for i, term in enumerate(terms)]
+        samples = []
+        for term in terms:
+            started = time.perf_counter()
+            client.get(f"/repositories/{repo_id}/search", params={"q": term})
+            samples.append(time.perf_counter() - started)
+        endpoints["search"] = latency(samples)
+
+        total_files = client.get(f"/repositories/{repo_id}/stats", params={"limit": 1}).json()["total_files"]
+        samples = []
+        for _ in range(queries):
+            started = time.perf_counter()
+            client.get(f"/repositories/{repo_id}/stats", params={"offset": rng.randrange(max(1, total_files)), "limit": 50})
+            samples.append(time.perf_counter() - started)
+        endpoints["stats"] = latency(samples)
+
+        samples = []
+        for _ in range(queries):
+            started = time.perf_counter()
+            client.get(f"/repositories/{repo_id}/symbols/{rng.choice(names)}/usages")
+            samples.append(time.perf_counter() - started)
+        endpoints["usages"] = latency(samples)
+
+        paths = [module["path"] for module in client.get(f"/repositories/{repo_id}/graph", params={"limit": 1000}).json()["modules"]]
+        samples = []
+        for _ in range(queries):
+            started = time.perf_counter()
+            client.get(f"/repositories/{repo_id}/graph", params={"path": rng.choice(paths)})
+            samples.append(time.perf_counter() - started)
+        endpoints["graph"] = latency(samples)
+    return endpoints
+
+
+def measure(spec, parse_workers: int, queries: int):
+    backend_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as workdir:
+        repo = os.path.join(workdir, "synthetic")
+        started = time.perf_counter()
+        repository = generate_repository(repo, spec)
+        repository["generate_seconds"] = round(time.perf_counter() - started, 3)
+
+        sys.path.insert(0, backend_dir)
+        os.chdir(workdir)
+        try:
+            stages, names = measure_stages(repo, parse_workers)
+            endpoints = measure_endpoints(repo, names, queries, random.Random(spec.seed))
+        finally:
+            # Leave the directory before it is removed
+            os.chdir(backend_dir)
+
+    return {
+        "benchmark": "pipeline",
+        "spec": spec._asdict(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parse_workers": parse_workers,
+        },
+        "repository": repository,
+        "stages": stages,
+        "endpoints": endpoints,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the clone/walk/parse/search pipeline")
+    spec_arguments(parser)
+    parser.add_argument('--parse-workers', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--output', help="Also write the result to this file")
+    args = parser.parse_args()
+
+    # Keep progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(spec_from_arguments(args), args.parse_workers, args.queries)
+        finally:
+            sys.stdout = stdout
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,86 @@
+"""Python parsing throughput: regex line scanner vs ast backend
+
+Run from backend/:  python -m benchmarks.bench_python_parser [repo_path]
+Defaults to the running interpreter's standard library as a large corpus.
+"""
+import ast
+import json
+import os
+import sys
+import time
+import warnings
+
+from parsers.code_parser import CodeParser
+from services.file_walker import walk_repository
+
+
+def load_sources(repo_path: str):
+    """Decoded Python sources, read up front so only parsing is timed"""
+    sources = []
+    for record in walk_repository(repo_path):
+        if record.extension != '.py':
+            continue
+        with open(record.path, 'rb') as f:
+            content = f.read()
+        text = content.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        sources.append((record.relative_path, text))
+    return sources
+
+
+def time_parser(parse, sources):
+    started = time.perf_counter()
+    elements = 0
+    for relative_path, text in sources:
+        elements += len(parse(text, relative_path))
+    return time.perf_counter() - started, elements
+
+
+def measure(repo_path: str):
+    parser = CodeParser()
+    sources = load_sources(repo_path)
+    total_bytes = sum(len(text) for _, text in sources)
+
+    # Files that do not compile take the regex path in both runs
+    fallbacks = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for relative_path, text in sources:
+            try:
+                ast.parse(text, filename=relative_path)
+            except (SyntaxError, ValueError):
+                fallbacks += 1
+
+    regex_seconds, regex_elements = time_parser(parser.parse_python_regex, sources)
+    ast_seconds, ast_elements = time_parser(parser.parse_python_source, sources)
+
+    return {
+        "repo_path": repo_path,
+        "files": len(sources),
+        "megabytes": round(total_bytes / 1e6, 2),
+        "ast_fallback_files": fallbacks,
+        "regex": {
+            "seconds": round(regex_seconds, 3),
+            "elements": regex_elements,
+            "files_per_second": round(len(sources) / regex_seconds, 1),
+            "megabytes_per_second": round(total_bytes / 1e6 / regex_seconds, 2),
+        },
+        "ast": {
+            "seconds": round(ast_seconds, 3),
+            "elements": ast_elements,
+            "files_per_second": round(len(sources) / ast_seconds, 1),
+            "megabytes_per_second": round(total_bytes / 1e6 / ast_seconds, 2),
+        },
+        "speedup": round(regex_seconds / ast_seconds, 2),
+    }
+
+
+if __name__ == "__main__":
+    repo_path = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.__file__)
+    # Keep parser progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(repo_path)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
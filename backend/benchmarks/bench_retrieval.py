@@ -0,0 +1,100 @@
+"""Top-k retrieval for /ask: latency, hit rate and prompt size
+
+Run from backend/:  python -m benchmarks.bench_retrieval [repo_path] [questions]
+Defaults to the running interpreter's standard library as a large corpus.
+Questions are the first docstring lines of sampled elements; a hit means the
+documented element is among the retrieved context.
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from parsers.code_parser import CodeParser
+from services.element_store import ElementStore
+from services.retrieval_index import RetrievalIndex
+
+# Mirrors the /ask defaults in main.py and services.app_services.Settings
+CONTEXT_ELEMENTS = 6
+SNIPPET_CHARS = 300
+
+
+def old_context(elements):
+    """Context the /ask endpoint used to send: the first 15 elements in walk order"""
+    return "\n---\n".join(
+        f"File: {element['file_path']}\nType: {element['type']}\nName: {element['name']}\nCode:\n{element['code'][:150]}...\n"
+        for element in elements[:15]
+    )
+
+
+def new_context(elements):
+    """Context /ask sends now: the retrieved elements, snippets capped"""
+    return "\n---\n".join(
+        f"{element['file_path']}:{element['start_line']} {element['type']} {element['name']}\n{element['code'][:SNIPPET_CHARS]}"
+        for element in elements
+    )
+
+
+def measure(repo_path: str, question_count: int):
+    parser = CodeParser()
+    store = ElementStore(repo_path)
+    index = RetrievalIndex()
+
+    started = time.perf_counter()
+    for parsed_file in parser.iter_parse_repository(repo_path):
+        # Index the stored elements, which carry their snippets read back from the source
+        first = len(store)
+        store.extend(parsed_file.elements)
+        index.add(store[first:])
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(0)
+    docstrings = store.column('docstring')
+    documented = [i for i, docstring in enumerate(docstrings) if len(docstring.split()) >= 4]
+    sample = rng.sample(documented, min(question_count, len(documented)))
+
+    latencies = []
+    hits = 0
+    prompt_chars = []
+    for element_id in sample:
+        question = docstrings[element_id].split('\n')[0]
+        started = time.perf_counter()
+        results = index.search(question, CONTEXT_ELEMENTS)
+        latencies.append(time.perf_counter() - started)
+        hits += any(result_id == element_id for result_id, _ in results)
+        prompt_chars.append(len(new_context(store.get_many(result_id for result_id, _ in results))))
+
+    first_elements = set(range(15))
+    old_hits = sum(element_id in first_elements for element_id in sample)
+    latencies.sort()
+
+    return {
+        "repo_path": repo_path,
+        "elements": len(store),
+        "build_seconds": round(build_seconds, 2),
+        "index_bytes": index.memory_usage(),
+        "questions": len(sample),
+        "k": CONTEXT_ELEMENTS,
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 2),
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "hit_rate": round(hits / len(sample), 3),
+        "old_hit_rate": round(old_hits / len(sample), 3),
+        # About 4 characters per token for code
+        "prompt_tokens_estimate": round(statistics.mean(prompt_chars) / 4),
+        "old_prompt_tokens_estimate": round(len(old_context(store)) / 4),
+    }
+
+
+if __name__ == "__main__":
+    repo_path = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.__file__)
+    question_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    # Keep parser progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(repo_path, question_count)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
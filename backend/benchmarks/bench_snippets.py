@@ -0,0 +1,93 @@
+"""Lazy snippets: parser output memory, search payload size and /snippet latency
+
+Run from backend/:  python -m benchmarks.bench_snippets [repo_path] [queries]
+Defaults to the running interpreter's standard library as a large corpus.
+The eager figures attach every element's snippet the way the parsers used to.
+"""
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from parsers.code_parser import CodeParser
+from services.element_store import ElementStore
+from services.repository_store import ParsedRepository
+
+
+def parsed_bytes(parser, repo_path, store=None):
+    """Bytes held by the parser's element dicts, with snippets attached when a store is given"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    elements = parser.parse_repository(repo_path)
+    if store is not None:
+        codes = store.get_codes(range(len(store)))
+        for index, element in enumerate(elements):
+            element['code'] = codes[index]
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return held
+
+
+def measure(repo_path: str, query_count: int):
+    parser = CodeParser()
+    parsed = ParsedRepository.create(ElementStore(repo_path))
+    for parsed_file in parser.iter_parse_repository(repo_path):
+        if parsed_file.elements:
+            parsed.elements.add_file(parsed_file.record.relative_path, parsed_file.line_offsets)
+        parsed.add(parsed_file.elements)
+    store = parsed.elements
+
+    lazy_bytes = parsed_bytes(parser, repo_path)
+    eager_bytes = parsed_bytes(parser, repo_path, store)
+
+    # Queries are names of sampled elements, as a user looking something up would type
+    rng = random.Random(0)
+    names = store.column('name')
+    queries = [names[i] for i in rng.sample(range(len(store)), min(query_count, len(store)))]
+    lazy_payload = []
+    eager_payload = []
+    for query in queries:
+        lazy_payload.append(len(json.dumps(parsed.search_index.search(query, 0, 20)[1])))
+        eager_payload.append(len(json.dumps(parsed.search_index.search(query, 0, 20, with_code=True)[1])))
+
+    file_paths = store.column('file_path')
+    start_lines = store.column('start_line')
+    end_lines = store.column('end_line')
+    latencies = []
+    for element_id in rng.sample(range(len(store)), min(query_count, len(store))):
+        started = time.perf_counter()
+        store.read_lines(file_paths[element_id], start_lines[element_id], end_lines[element_id])
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "repo_path": repo_path,
+        "elements": len(store),
+        "parsed_bytes_lazy": lazy_bytes,
+        "parsed_bytes_eager": eager_bytes,
+        "parsed_reduction": round(eager_bytes / max(1, lazy_bytes), 2),
+        "queries": len(queries),
+        "search_payload_bytes_mean_lazy": round(statistics.mean(lazy_payload)),
+        "search_payload_bytes_mean_eager": round(statistics.mean(eager_payload)),
+        "search_payload_reduction": round(sum(eager_payload) / max(1, sum(lazy_payload)), 2),
+        "line_index_bytes": sum(sys.getsizeof(offsets) for offsets in store._line_offsets.values()),
+        "snippet_ms_p50": round(statistics.median(latencies) * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    repo_path = sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.__file__)
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    # Keep parser progress output out of the machine-readable result
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = measure(repo_path, query_count)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,122 @@
+"""Cold-start cost of the API: import time of main and time to the first response
+
+Run from backend/:  python -m benchmarks.bench_startup [--runs N] [--budget-ms MS] [--output result.json]
+Each run is a fresh interpreter. Import time is what `python -X importtime`
+reports for main, so it is free of interpreter start-up; the slowest imports
+are listed by top-level package. Time to first request covers interpreter
+start, import, app startup and one GET / through FastAPI's test client.
+Exits with status 1 when the median import time exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FIRST_REQUEST = """
+import sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+from fastapi.testclient import TestClient
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    started_app = time.perf_counter()
+    client.get("/").raise_for_status()
+    answered = time.perf_counter()
+print(imported - started, started_app - imported, answered - started_app)
+"""
+
+
+def import_profile(backend_dir, workdir):
+    """{module: (self us, cumulative us)} from one `python -X importtime` import of main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {backend_dir!r}); import main"],
+        cwd=workdir, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def by_package(modules, top):
+    """Self import time summed per top-level package, slowest first"""
+    totals = {}
+    for name, (own, _) in modules.items():
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + own
+    slowest = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return {package: round(us / 1000, 2) for package, us in slowest}
+
+
+def first_request(backend_dir, workdir):
+    """(seconds to start the process and answer, import, app startup, first request)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST, backend_dir],
+        cwd=workdir, capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - started
+    return (total, *map(float, result.stdout.split()[-3:]))
+
+
+def milliseconds(samples):
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def measure(runs: int, budget_ms: float, top: int):
+    backend_dir = os.getcwd()
+    # Importing main should create nothing here; only app startup may
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        import_ms = []
+        profile = None
+        for _ in range(runs):
+            profile = import_profile(backend_dir, workdir)
+            import_ms.append(profile["main"][1] / 1000)
+        created_by_import = sorted(os.listdir(workdir))
+        requests = [first_request(backend_dir, workdir) for _ in range(runs)]
+    median_import = statistics.median(import_ms)
+
+    return {
+        "benchmark": "startup",
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "import_main_ms": round(median_import, 1),
+        "import_main_ms_min": round(min(import_ms), 1),
+        "budget_ms": budget_ms,
+        "within_budget": median_import <= budget_ms,
+        "slowest_packages_ms": by_package(profile, top),
+        "deferred_modules": {name: name in profile for name in ("git", "openai", "numpy")},
+        "first_request": {
+            "total_ms": milliseconds([r[0] for r in requests]),
+            "import_ms": milliseconds([r[1] for r in requests]),
+            "app_startup_ms": milliseconds([r[2] for r in requests]),
+            "request_ms": milliseconds([r[3] for r in requests]),
+        },
+        "files_created_by_import": created_by_import,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API import time and time to first request")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=600,
+                        help="Largest acceptable median import time of main, in milliseconds")
+    parser.add_argument('--top', type=int, default=10, help="Slowest packages to list")
+    parser.add_argument('--output', help="Also write the result to this file")
+    args = parser.parse_args()
+
+    result = measure(args.runs, args.budget_ms, args.top)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    sys.exit(0 if result["within_budget"] else 1)
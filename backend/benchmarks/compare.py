@@ -0,0 +1,36 @@
+"""Compare two benchmark results metric by metric
+
+Run from backend/:  python -m benchmarks.compare baseline.json candidate.json
+Works with the JSON any benchmark here prints. Every numeric field present in
+both runs is reported with its ratio candidate / baseline.
+"""
+import json
+import sys
+
+
+def numeric_fields(result, prefix=''):
+    """Flatten nested dicts into {'stages.parse.seconds': value} for numeric leaves"""
+    fields = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            fields.update(numeric_fields(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields[name] = value
+    return fields
+
+
+def compare(baseline, candidate):
+    old, new = numeric_fields(baseline), numeric_fields(candidate)
+    return {
+        name: {"baseline": old[name], "candidate": new[name], "ratio": round(new[name] / old[name], 3) if old[name] else None}
+        for name in old if name in new
+    }
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        baseline = json.load(f)
+    with open(sys.argv[2]) as f:
+        candidate = json.load(f)
+    print(json.dumps(compare(baseline, candidate), indent=2))
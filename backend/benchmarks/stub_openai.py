@@ -0,0 +1,41 @@
+"""Minimal stand-in for the OpenAI chat completions API
+
+Run from backend/:  uvicorn benchmarks.stub_openai:app --port 8001
+then start the API with OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+STUB_DELAY_SECONDS sets how long each completion takes; GET /calls reports
+how many completions were requested.
+"""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="OpenAI stub")
+app.state.calls = 0
+app.state.delay = float(os.getenv("STUB_DELAY_SECONDS", 0.5))
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.calls += 1
+    await asyncio.sleep(app.state.delay)
+    question = body["messages"][-1]["content"].rsplit("Question:", 1)[-1].strip()
+    return {
+        "id": f"chatcmpl-stub-{app.state.calls}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": f"Stub answer to: {question}"},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/calls")
+async def calls():
+    return {"calls": app.state.calls}
@@ -0,0 +1,208 @@
+"""Deterministic synthetic repositories for benchmarking the analysis pipeline
+
+Run from backend/:  python -m benchmarks.synthetic_repo out_dir [--files N] [--languages python=5,javascript=3]
+The same spec and seed always produce byte-identical trees, committed as one
+git commit so the result can be cloned like any other repository.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+from typing import NamedTuple
+
+# Extension written for each language of the mix; text files are not parsed
+LANGUAGE_EXTENSIONS = {
+    'python': '.py',
+    'javascript': '.js',
+    'typescript': '.ts',
+    'text': '.md',
+}
+
+_WORDS = (
+    'user', 'session', 'request', 'response', 'cache', 'token', 'config', 'record', 'parser', 'index',
+    'query', 'result', 'payload', 'handler', 'client', 'server', 'stream', 'buffer', 'event', 'queue',
+    'worker', 'task', 'schema', 'field', 'value', 'account', 'order', 'invoice', 'report', 'metric',
+)
+_VERBS = ('load', 'save', 'build', 'parse', 'fetch', 'update', 'render', 'validate', 'resolve', 'merge')
+
+
+class RepoSpec(NamedTuple):
+    """Shape of a synthetic repository"""
+    files: int = 1000
+    # (language, weight) pairs; weights need not sum to anything in particular
+    languages: tuple = (('python', 5), ('javascript', 3), ('typescript', 2), ('text', 1))
+    # Average lines per source file; sizes follow a log-normal spread around it
+    # and the last definition of a file is always completed
+    mean_lines: int = 120
+    # Deepest directory nesting below the repository root
+    depth: int = 6
+    # Packages under node_modules, each with a few files the walker must prune
+    node_modules_packages: int = 200
+    # Minified bundles; half are named *.min.js, half look like ordinary modules
+    minified_files: int = 4
+    seed: int = 0
+
+
+def parse_languages(text: str):
+    """'python=5,javascript=3' -> (('python', 5), ('javascript', 3))"""
+    mix = []
+    for part in text.split(','):
+        language, _, weight = part.partition('=')
+        if language not in LANGUAGE_EXTENSIONS:
+            raise ValueError(f"Unknown language {language!r}; expected one of {sorted(LANGUAGE_EXTENSIONS)}")
+        mix.append((language, float(weight or 1)))
+    return tuple(mix)
+
+
+def generate_repository(root: str, spec: RepoSpec = RepoSpec(), commit: bool = True):
+    """Write a repository shaped by spec under root and return a summary of it"""
+    rng = random.Random(spec.seed)
+    os.makedirs(root, exist_ok=True)
+    languages = [language for language, _ in spec.languages]
+    weights = [weight for _, weight in spec.languages]
+    directories = _directories(rng, spec.depth, max(1, spec.files // 12))
+
+    summary = {"files": 0, "bytes": 0, "lines": 0, "by_language": {}, "node_modules_files": 0, "minified_files": 0}
+    for number in range(spec.files):
+        language = rng.choices(languages, weights)[0]
+        lines = max(5, min(int(rng.lognormvariate(0, 0.8) * spec.mean_lines / 1.37), spec.mean_lines * 20))
+        relative_path = os.path.join(rng.choice(directories), f"{rng.choice(_WORDS)}_{number}{LANGUAGE_EXTENSIONS[language]}")
+        content = _SOURCES[language](rng, lines)
+        _write(root, relative_path, content, summary)
+        summary["lines"] += content.count('\n')
+        summary["by_language"][language] = summary["by_language"].get(language, 0) + 1
+
+    for number in range(spec.node_modules_packages):
+        package = f"node_modules/{rng.choice(_WORDS)}-{number}"
+        _write(root, f"{package}/package.json", json.dumps({"name": package.split('/')[-1], "version": "1.0.0"}), summary)
+        _write(root, f"{package}/index.js", _javascript(rng, 60), summary)
+        _write(root, f"{package}/lib/util.js", _javascript(rng, 40), summary)
+        summary["node_modules_files"] += 3
+
+    for number in range(spec.minified_files):
+        name = f"static/app_{number}.min.js" if number % 2 == 0 else f"src/bundle_{number}.js"
+        _write(root, name, _minified(rng, 400), summary)
+        summary["minified_files"] += 1
+
+    if commit:
+        for command in (["init", "-q"], ["add", "-A"], ["-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "synthetic"]):
+            subprocess.run(["git", *command], cwd=root, check=True)
+    return summary
+
+
+def _directories(rng, depth, count):
+    """Directory paths spread over every level down to depth"""
+    directories = ['.']
+    for _ in range(count):
+        parts = ['src'] + [f"{rng.choice(_WORDS)}_{rng.randrange(4)}" for _ in range(rng.randrange(depth))]
+        directories.append(os.path.join(*parts))
+    return directories
+
+
+def _write(root, relative_path, content, summary):
+    path = os.path.join(root, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = content.encode()
+    with open(path, 'wb') as f:
+        f.write(data)
+    summary["files"] += 1
+    summary["bytes"] += len(data)
+
+
+def _name(rng, capitalized=False):
+    verb, noun = rng.choice(_VERBS), rng.choice(_WORDS)
+    return f"{verb.capitalize()}{noun.capitalize()}" if capitalized else f"{verb}_{noun}"
+
+
+def _sentence(rng):
+    return f"{rng.choice(_VERBS).capitalize()} the {rng.choice(_WORDS)} {rng.choice(_WORDS)} for each {rng.choice(_WORDS)}"
+
+
+def _python(rng, lines):
+    out = [f'"""{_sentence(rng)}"""', 'import os', 'import json', '']
+    while len(out) < lines:
+        if rng.random() < 0.3:
+            out += ['', f'class {_name(rng, True)}:', f'    """{_sentence(rng)}"""', '']
+            for _ in range(rng.randrange(1, 4)):
+                out += [f'    def {_name(rng)}(self, {rng.choice(_WORDS)}):', f'        """{_sentence(rng)}"""']
+                out += [f'        {rng.choice(_WORDS)} = self.{rng.choice(_WORDS)}.get({rng.choice(_WORDS)!r})' for _ in range(rng.randrange(2, 8))]
+                out += [f'        return {rng.choice(_WORDS)}', '']
+        else:
+            out += ['', f'def {_name(rng)}({rng.choice(_WORDS)}, {rng.choice(_WORDS)}=None):', f'    """{_sentence(rng)}"""']
+            out += [f'    if {rng.choice(_WORDS)} is None:', f'        {rng.choice(_WORDS)} = {{}}']
+            out += [f'    {rng.choice(_WORDS)} = json.dumps({rng.choice(_WORDS)})' for _ in range(rng.randrange(2, 10))]
+            out += [f'    return {rng.choice(_WORDS)}', '']
+    return '\n'.join(out) + '\n'
+
+
+def _javascript(rng, lines, typed=False):
+    annotation = ': string' if typed else ''
+    out = [f'// {_sentence(rng)}', "import { helper } from './helper';", '']
+    while len(out) < lines:
+        choice = rng.random()
+        if choice < 0.25:
+            out += [f'/** {_sentence(rng)} */', f'export class {_name(rng, True)} {{']
+            for _ in range(rng.randrange(1, 4)):
+                out += [f'  async {rng.choice(_VERBS)}{rng.choice(_WORDS).capitalize()}({rng.choice(_WORDS)}{annotation}) {{']
+                out += [f'    const {rng.choice(_WORDS)} = await helper({rng.choice(_WORDS)});' for _ in range(rng.randrange(2, 6))]
+                out += ['    return null;', '  }']
+            out += ['}', '']
+        elif choice < 0.6:
+            out += [f'/** {_sentence(rng)} */', f'export function {_name(rng)}({rng.choice(_WORDS)}{annotation}) {{']
+            out += [f'  const {rng.choice(_WORDS)} = helper("{rng.choice(_WORDS)}");' for _ in range(rng.randrange(2, 8))]
+            out += ['  return { ok: true };', '}', '']
+        else:
+            out += [f'const {_name(rng)} = ({rng.choice(_WORDS)}{annotation}) => {{']
+            out += [f'  console.log("{_sentence(rng)}");' for _ in range(rng.randrange(1, 5))]
+            out += ['};', '']
+    return '\n'.join(out) + '\n'
+
+
+def _typescript(rng, lines):
+    return _javascript(rng, lines, typed=True)
+
+
+def _text(rng, lines):
+    return '\n'.join(f"{_sentence(rng)}." for _ in range(lines)) + '\n'
+
+
+def _minified(rng, functions):
+    """One very long line of packed functions, as a bundler emits"""
+    return ';'.join(
+        f"function {_name(rng)}_{i}(a,b){{var c=a+b;return c?{rng.randrange(1000)}:null}}" for i in range(functions)
+    ) + '\n'
+
+
+_SOURCES = {
+    'python': _python,
+    'javascript': _javascript,
+    'typescript': _typescript,
+    'text': _text,
+}
+
+
+def spec_arguments(parser: argparse.ArgumentParser):
+    """Add a --flag for every RepoSpec field to parser"""
+    defaults = RepoSpec()
+    parser.add_argument('--files', type=int, default=defaults.files)
+    parser.add_argument('--languages', type=parse_languages, default=defaults.languages,
+                        help="language=weight pairs, e.g. python=5,javascript=3,typescript=2,text=1")
+    parser.add_argument('--mean-lines', type=int, default=defaults.mean_lines)
+    parser.add_argument('--depth', type=int, default=defaults.depth)
+    parser.add_argument('--node-modules-packages', type=int, default=defaults.node_modules_packages)
+    parser.add_argument('--minified-files', type=int, default=defaults.minified_files)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+
+
+def spec_from_arguments(args):
+    return RepoSpec(**{field: getattr(args, field) for field in RepoSpec._fields})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic repository")
+    parser.add_argument('out_dir')
+    spec_arguments(parser)
+    args = parser.parse_args()
+    spec = spec_from_arguments(args)
+    print(json.dumps({"spec": spec._asdict(), **generate_repository(args.out_dir, spec)}, indent=2))
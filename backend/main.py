@@ -1,204 +1,677 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from services.repo_service import RepositoryService
-from parsers.code_parser import CodeParser
-import os
-from dotenv import load_dotenv
+import heapq
+import json
+import logging
+import time
+import uuid
+from collections import Counter, defaultdict
+from itertools import islice
+from parsers.code_parser import EXTENSION_LANGUAGES
+from services.app_services import AppServices, Settings
+from services.element_store import ElementStore
+from services.file_classifier import SOURCE
+from services.repository_store import ParsedRepository
+from services.job_scheduler import JobCancelledError, QueueFullError
+from services.repo_stats import RepositoryStats
 
-# Debug environment loading
-print("=== DEBUG START ===")
-print(f"Current directory: {os.getcwd()}")
-print(f".env exists: {os.path.exists('.env')}")
-
-# Load environment
-load_dotenv()
-
-# Check what was loaded
-api_key = os.getenv("OPENAI_API_KEY")
-openai_client = None
-try:
-    if api_key:
-        from openai import OpenAI
-        openai_client = OpenAI(api_key=api_key)
-        print("✅ OpenAI client initialized successfully")
-    else:
-        print("⚠️ No OpenAI API key found - using mock responses")
-except Exception as e:
-    print(f"❌ Error initializing OpenAI client: {e}")
-    openai_client = None
-
-app = FastAPI(title="Repo Analyzer API")
-
-# CORS middleware for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Initialize services
-repo_service = RepositoryService()
-code_parser = CodeParser()
-executor = ThreadPoolExecutor(max_workers=3)
+logger = logging.getLogger("repo_analyzer")
+
+# Seconds between progress checks on the events stream
+EVENT_INTERVAL = 0.25
+
+# Most lines one /snippet request returns
+SNIPPET_MAX_LINES = 2000
+
+# How much of each /ask context snippet is sent
+ASK_SNIPPET_CHARS = 300
+
+# Most repositories one /repositories/batch request may submit
+BATCH_MAX_REPOSITORIES = 100
+
+router = APIRouter()
+
+def get_services(request: Request) -> AppServices:
+    """Services of the app serving this request, injected into endpoints with Depends"""
+    return request.app.state.services
 
 class RepositoryRequest(BaseModel):
     github_url: str
+    # Branch or tag to analyse; the default branch when left out
+    ref: str = None
+    priority: int = 0
+
+class BatchRequest(BaseModel):
+    repositories: list[RepositoryRequest]
 
 class QueryRequest(BaseModel):
     query: str
     repo_id: str
 
-# In-memory storage
-repositories = {}
-parsed_code = {}
+async def record_request_latency(request: Request, call_next):
+    """Observe every request's latency under its route template, so ids do not explode the labels"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        request.app.state.services.request_seconds.labels(
+            request.method, route.path if route is not None else "unmatched", status
+        ).observe(time.perf_counter() - started)
 
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "Repo Analyzer API is running"}
 
-@app.post("/repositories")
-async def create_repository(request: RepositoryRequest):
-    repo_id = f"repo_{len(repositories) + 1}"
+@router.get("/metrics")
+async def get_metrics(services: AppServices = Depends(get_services)):
+    """Stage timings, request latencies and resource gauges in the Prometheus text format"""
+    return PlainTextResponse(services.metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.post("/repositories")
+async def create_repository(request: RepositoryRequest, services: AppServices = Depends(get_services)):
+    if not services.scheduler.running:
+        raise HTTPException(status_code=503, detail="Job scheduler is not running")
+    try:
+        return submit_repository(services, request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many pending repositories: {e}", headers={"Retry-After": "30"})
+
+@router.post("/repositories/batch")
+async def create_repositories(request: BatchRequest, services: AppServices = Depends(get_services)):
+    """Queue many repositories, such as forks, mirrors and release branches, as one batch
+
+    They are processed side by side; a file identical across them is parsed
+    once, by whichever job reaches it first, and stored once. Entries the
+    queue has no room for come back rejected without failing the batch.
+    """
+    if not services.scheduler.running:
+        raise HTTPException(status_code=503, detail="Job scheduler is not running")
+    if not 1 <= len(request.repositories) <= BATCH_MAX_REPOSITORIES:
+        raise HTTPException(status_code=400, detail=f"A batch holds 1 to {BATCH_MAX_REPOSITORIES} repositories")
     
-    # Store initial state
-    repositories[repo_id] = {
-        "id": repo_id,
-        "github_url": request.github_url,
-        "status": "cloning"
-    }
+    repositories = []
+    for item in request.repositories:
+        try:
+            repositories.append(submit_repository(services, item))
+        except QueueFullError as e:
+            repositories.append({"github_url": item.github_url, "ref": item.ref, "status": "rejected", "error": str(e)})
+    
+    # Random rather than counted, so ids stay unique across restarts and cannot be guessed
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    # Resubmitting a repository twice in one batch returns the same repo_id
+    services.repository_store.save_batch(
+        batch_id, dict.fromkeys(entry["repo_id"] for entry in repositories if "repo_id" in entry)
+    )
+    return {"batch_id": batch_id, "repositories": repositories}
+
+def submit_repository(services: AppServices, request: RepositoryRequest):
+    """Queue processing of one repository at a ref, returning its repo_id, status and job_id
+
+    Raises QueueFullError when the scheduler has no room for another job.
+    """
+    # One entry per repository and ref, however the URL is spelled
+    repository_key = services.repo_service.repository_key(request.github_url, request.ref)
+    repo_id = services.repository_store.find_repository(repository_key)
     
-    # Start background processing
-    asyncio.create_task(process_repository(repo_id, request.github_url))
+    # Only a job the scheduler still has is worth waiting on; a status left
+    # behind by a cancelled job must not turn the resubmission away
+    if (repo_id is not None and services.scheduler.in_flight(repository_key) is not None
+            and services.get_repository_info(repo_id)["status"] in ("queued", "cloning", "parsing")):
+        info = services.repositories[repo_id]
+        return {"repo_id": repo_id, "status": info["status"], "job_id": info.get("job_id")}
     
-    return {"repo_id": repo_id, "status": "cloning"}
+    if repo_id is None:
+        repo_id = f"repo_{services.repository_store.count_repositories() + 1}"
+    
+    # Queue background processing; jobs for the same URL and ref are deduplicated
+    job = services.scheduler.submit(
+        repository_key,
+        lambda job: process_repository(services, repo_id, request.github_url, job, request.ref),
+        priority=request.priority,
+        on_cancel=lambda job: cancel_queued_repository(services, repo_id, job)
+    )
+    
+    # Store initial state; a re-submission keeps its previous results until replaced
+    info = services.repositories.setdefault(repo_id, {"id": repo_id})
+    info.pop("error", None)
+    info.update({
+        "github_url": request.github_url,
+        "ref": request.ref,
+        # Includes #ref, so each branch or tag is a repository of its own
+        "normalized_url": repository_key,
+        "status": "queued",
+        "job_id": job.job_id
+    })
+    services.save_repository_info(repo_id)
+    
+    return {"repo_id": repo_id, "status": "queued", "job_id": job.job_id}
+
+def cancel_queued_repository(services: AppServices, repo_id: str, job):
+    """Mark a repository failed when its job is cancelled before process_repository starts"""
+    info = services.repositories.get(repo_id)
+    if info is None or info.get("job_id") != job.job_id:
+        return
+    info["status"] = "error"
+    info["error"] = "Processing was cancelled before it started"
+    services.save_repository_info(repo_id)
+    services.repositories_processed.labels(job.status).inc()
 
-async def process_repository(repo_id: str, github_url: str):
+async def process_repository(services: AppServices, repo_id: str, github_url: str, job, ref: str = None):
     """Process repository in background"""
     try:
-        print(f"Starting to process repository {repo_id} from {github_url}")
+        logger.info("Starting to process repository %s from %s", repo_id, github_url)
+        services.repositories[repo_id]["status"] = "cloning"
+        services.save_repository_info(repo_id)
         
-        # Clone repository
+        # Clone repository, or fetch into the existing checkout
         loop = asyncio.get_event_loop()
-        repo_path = await loop.run_in_executor(
-            executor, 
-            repo_service.clone_repository, 
-            github_url, 
-            repo_id
-        )
+        with services.stage_seconds.labels("clone").time():
+            clone_result = await loop.run_in_executor(
+                services.scheduler.clone_executor, 
+                services.repo_service.clone_repository, 
+                github_url,
+                ref
+            )
+        repo_path = clone_result["repo_path"]
         
-        print(f"Repository cloned to {repo_path}")
+        logger.info("Repository cloned to %s", repo_path)
         
-        # Get file structure
-        files = await loop.run_in_executor(
-            executor,
-            repo_service.get_file_structure,
-            repo_path
-        )
+        # Counters streamed to /repositories/{repo_id}/events
+        progress = {"files_walked": 0, "files_parsed": 0, "elements_found": 0}
+        services.repositories[repo_id]["progress"] = progress
+        
+        # Walk the checkout once; listing and parsing share the records
+        with services.stage_seconds.labels("walk").time():
+            records, files, stats = await loop.run_in_executor(
+                services.scheduler.parse_executor,
+                walk_checkout,
+                services,
+                repo_path,
+                progress
+            )
+        services.live_stats[repo_id] = stats
         
-        print(f"Found {len(files)} files")
+        logger.info("Found %d files", len(files))
         
         # Parse code elements
-        repositories[repo_id]["status"] = "parsing"
-        print(f"Starting code parsing for {repo_id}")
+        services.repositories[repo_id]["status"] = "parsing"
+        services.save_repository_info(repo_id)
+        logger.info("Starting code parsing for %s", repo_id)
         
-        code_elements = await loop.run_in_executor(
-            executor,
-            code_parser.parse_repository,
-            repo_path
-        )
+        # Publish the growing element store and index right away so the
+        # repository is searchable while parsing continues
+        parsed = ParsedRepository.create(ElementStore(repo_path))
+        code_elements = parsed.elements
+        services.loaded_repos.start(repo_id, parsed)
         
-        print(f"Parsed {len(code_elements)} code elements")
+        cache_stats = {}
+        with services.stage_seconds.labels("parse").time():
+            await loop.run_in_executor(
+                services.scheduler.parse_executor,
+                parse_incrementally,
+                services,
+                repo_path,
+                records,
+                parsed,
+                stats,
+                progress,
+                cache_stats,
+                job
+            )
         
-        # Store parsed code
-        parsed_code[repo_id] = code_elements
-        print(f"Stored code elements for {repo_id}")
+        logger.info("Parsed %d code elements", len(code_elements))
+        
+        with services.stage_seconds.labels("store").time():
+            await loop.run_in_executor(
+                services.scheduler.parse_executor,
+                services.repository_store.save_elements,
+                repo_id,
+                code_elements,
+                clone_result["head"]
+            )
+            await loop.run_in_executor(
+                services.scheduler.parse_executor,
+                services.repository_store.save_files,
+                repo_id,
+                stats.file_rows()
+            )
+            await loop.run_in_executor(
+                services.scheduler.parse_executor,
+                services.repository_store.save_references,
+                repo_id,
+                parsed.references
+            )
+        services.loaded_repos.finish(repo_id)
         
         # Update repository info
-        repositories[repo_id].update({
+        services.repositories[repo_id].update({
             "status": "ready",
             "repo_path": repo_path,
+            "head": clone_result["head"],
+            "changed_files": clone_result["changed_files"],
             "file_count": len(files),
             "code_elements_count": len(code_elements),
-            "files": files[:100]  # Limit for API response
+            "parse_cache": cache_stats,
+            "stats": stats.summary(),
+            "files": files[:100]  # Preview; /repositories/{repo_id}/stats pages through all of them
         })
+        services.live_stats.pop(repo_id, None)
+        services.save_repository_info(repo_id)
         
-        print(f"Repository {repo_id} processing complete")
+        services.repositories_processed.labels("ready").inc()
+        logger.info("Repository %s processing complete", repo_id)
         
+    except (asyncio.CancelledError, JobCancelledError):
+        logger.info("Processing of repository %s stopped: job %s", repo_id, job.status)
+        services.repositories[repo_id]["status"] = "error"
+        services.repositories[repo_id]["error"] = "Processing timed out" if job.status == "timeout" else "Processing was cancelled"
+        services.save_repository_info(repo_id)
+        services.live_stats.pop(repo_id, None)
+        # The partial parse is dropped; the last stored one reloads on demand
+        services.loaded_repos.discard(repo_id)
+        services.repositories_processed.labels(job.status).inc()
+        raise
     except Exception as e:
-        print(f"Error processing repository {repo_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        repositories[repo_id]["status"] = "error"
-        repositories[repo_id]["error"] = str(e)
-
-@app.get("/repositories/{repo_id}")
-async def get_repository(repo_id: str):
-    if repo_id not in repositories:
+        logger.exception("Error processing repository %s", repo_id)
+        services.repositories[repo_id]["status"] = "error"
+        services.repositories[repo_id]["error"] = str(e)
+        services.save_repository_info(repo_id)
+        services.live_stats.pop(repo_id, None)
+        # The partial parse is dropped; the last stored one reloads on demand
+        services.loaded_repos.discard(repo_id)
+        services.repositories_processed.labels("error").inc()
+
+def walk_checkout(services: AppServices, repo_path, progress):
+    """Walk the checkout and build its file listing and stats, off the event loop"""
+    records = services.repo_service.walk_repository(repo_path, progress)
+    files = services.repo_service.get_file_structure(repo_path, records)
+    stats = RepositoryStats()
+    stats.add_files(records)
+    return records, files, stats
+
+def parse_incrementally(services: AppServices, repo_path, records, parsed, stats, progress, cache_stats, job):
+    """Consume the parser's per-file stream, publishing elements as each file completes"""
+    for parsed_file in services.code_parser.iter_parse_repository(repo_path, records, cache_stats):
+        job.check_cancelled()
+        record_parsed_file(services, parsed_file)
+        if parsed_file.elements:
+            # Keep the parser's line index so snippets of this file need no rescan
+            parsed.elements.add_file(parsed_file.record.relative_path, parsed_file.line_offsets)
+        parsed.add(parsed_file.elements)
+        if parsed_file.references is not None:
+            parsed.references.add_file(parsed_file.record.relative_path, parsed_file.references)
+        stats.add_parsed(parsed_file)
+        progress["files_parsed"] += 1
+        progress["elements_found"] = len(parsed.elements)
+    # Resolve the import graph once, so /graph serves prebuilt adjacency lists
+    parsed.references.graph()
+
+def record_parsed_file(services: AppServices, parsed_file):
+    language = EXTENSION_LANGUAGES.get(parsed_file.record.extension, "other")
+    if parsed_file.category != SOURCE:
+        services.parsed_files.labels(language, "skipped").inc()
+        return
+    if parsed_file.seconds is None:
+        services.parsed_files.labels(language, "cache").inc()
+    else:
+        services.parsed_files.labels(language, "parser").inc()
+        services.parse_file_seconds.labels(language).observe(parsed_file.seconds)
+    services.parsed_bytes.labels(language).inc(parsed_file.record.size)
+
+@router.get("/repositories/{repo_id}")
+async def get_repository(repo_id: str, services: AppServices = Depends(get_services)):
+    info = services.get_repository_info(repo_id)
+    if info is None:
         raise HTTPException(status_code=404, detail="Repository not found")
-    return repositories[repo_id]
+    return info
 
-@app.get("/repositories/{repo_id}/search")
-async def search_code(repo_id: str, q: str = ""):
-    """Search for code elements by name or content"""
-    print(f"Search request for repo {repo_id} with query: '{q}'")
+@router.get("/repositories/{repo_id}/stats")
+async def get_repository_stats(
+    repo_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    services: AppServices = Depends(get_services)
+):
+    """Summary computed at parse time, with a page of the file listing"""
+    info = services.get_repository_info(repo_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Repository not found")
     
-    if repo_id not in parsed_code:
-        print(f"Repository {repo_id} not found in parsed_code. Available: {list(parsed_code.keys())}")
+    stats = services.live_stats.get(repo_id)
+    if stats is not None:
+        summary, files = stats.summary(), stats.page(offset, limit)
+    elif "stats" in info:
+        summary = info["stats"]
+        loop = asyncio.get_event_loop()
+        files = await loop.run_in_executor(services.executor, services.repository_store.load_files, repo_id, offset, limit)
+    else:
+        raise HTTPException(status_code=404, detail="No statistics for this repository yet; re-submit it to compute them")
+    
+    return {
+        "summary": summary,
+        "files": files,
+        "total_files": summary["file_count"],
+        "offset": offset,
+        "limit": limit,
+        # Counts cover only the files parsed so far
+        "partial": stats is not None
+    }
+
+@router.get("/jobs")
+async def list_jobs(services: AppServices = Depends(get_services)):
+    """Queued, running and recently finished processing jobs"""
+    return {
+        "queue_depth": services.scheduler.queue_depth(),
+        "max_queue": services.scheduler.max_queue,
+        "jobs": [job.to_dict() for job in services.scheduler.jobs.values()]
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, services: AppServices = Depends(get_services)):
+    job = services.scheduler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, services: AppServices = Depends(get_services)):
+    """Cancel a queued or running job"""
+    job = services.scheduler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not services.scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job.to_dict()
+
+@router.get("/repositories/{repo_id}/events")
+async def repository_events(repo_id: str, services: AppServices = Depends(get_services)):
+    """Stream processing progress as Server-Sent Events until the repository is ready"""
+    if services.get_repository_info(repo_id) is None:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    
+    async def event_stream():
+        last_event = None
+        while True:
+            info = services.repositories[repo_id]
+            event = {"status": info["status"], **info.get("progress", {})}
+            if info["status"] == "error":
+                event["error"] = info.get("error")
+            
+            if event != last_event:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                last_event = event
+            
+            if info["status"] in ("ready", "error"):
+                yield f"event: done\ndata: {json.dumps(event)}\n\n"
+                return
+            await asyncio.sleep(EVENT_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@router.get("/repositories/{repo_id}/search")
+async def search_code(
+    repo_id: str,
+    q: str = "",
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    include_code: bool = False,
+    services: AppServices = Depends(get_services)
+):
+    """Search for code elements by name or content
+
+    Results leave out their snippets unless include_code is set; clients
+    fetch the ones they show from /repositories/{repo_id}/snippet.
+    """
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="Repository not found or not parsed")
     
-    elements = parsed_code[repo_id]
-    print(f"Found {len(elements)} total elements in {repo_id}")
+    # Confirming code hits reads source files; keep that off the event loop
+    loop = asyncio.get_event_loop()
+    total, results = await loop.run_in_executor(
+        services.executor, loaded.search_index.search, q, offset, limit, include_code
+    )
+    
+    logger.debug("Search %s for %r returned %d results", repo_id, q, total)
+    return {
+        "results": results,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        # Results cover only the files parsed so far
+        "partial": services.repositories.get(repo_id, {}).get("status") != "ready"
+    }
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str, services: AppServices = Depends(get_services)):
+    """Progress of a batch: each repository's status, and how much parsing the batch shared"""
+    repo_ids = services.repository_store.load_batch(batch_id)
+    if repo_ids is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    repositories = []
+    status_counts = Counter()
+    parse_cache = Counter()
+    for repo_id in repo_ids:
+        info = services.get_repository_info(repo_id) or {}
+        status_counts[info.get("status")] += 1
+        parse_cache.update(info.get("parse_cache") or {})
+        repositories.append({
+            "repo_id": repo_id,
+            "github_url": info.get("github_url"),
+            "ref": info.get("ref"),
+            "status": info.get("status"),
+            "error": info.get("error"),
+            "code_elements_count": info.get("code_elements_count")
+        })
+    return {
+        "batch_id": batch_id,
+        "repositories": repositories,
+        "status_counts": dict(status_counts),
+        "done": status_counts["ready"] + status_counts["error"] == len(repo_ids),
+        # Files served by the parse cache, parsed, or taken from another job of the batch
+        "parse_cache": dict(parse_cache)
+    }
+
+@router.get("/search")
+async def search_repositories(
+    q: str = Query(..., min_length=1),
+    repo_id: list[str] = Query(None),
+    batch_id: str = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    include_code: bool = False,
+    services: AppServices = Depends(get_services)
+):
+    """One search across several repositories, given as repo_id parameters and/or a batch_id
+
+    Matches are merged best first, ties in the order the repositories were
+    given, and each result names its repository; only the page is materialized.
+    """
+    repo_ids = list(repo_id or [])
+    if batch_id is not None:
+        batch_repo_ids = services.repository_store.load_batch(batch_id)
+        if batch_repo_ids is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        repo_ids.extend(batch_repo_ids)
+    if not repo_ids:
+        raise HTTPException(status_code=400, detail="Give at least one repo_id or a batch_id")
     
-    if not q:
-        print("No query provided, returning first 20 elements")
-        return {"results": elements[:20]}  # Return first 20 if no query
+    searched = []
+    missing = []
+    for candidate in dict.fromkeys(repo_ids):
+        loaded = await services.get_parsed(candidate)
+        if loaded is None:
+            missing.append(candidate)
+        else:
+            searched.append((candidate, loaded))
     
-    # Simple text search
-    query_lower = q.lower()
-    results = []
+    def search_page():
+        matches = [
+            [(rank, position, element_id) for rank, element_id in loaded.search_index.ranked(q)]
+            for position, (_, loaded) in enumerate(searched)
+        ]
+        page = list(islice(heapq.merge(*matches), offset, offset + limit))
+        
+        # Materialize the page per repository, so each reads its source files once
+        by_repository = defaultdict(list)
+        for _, position, element_id in page:
+            by_repository[position].append(element_id)
+        elements = {
+            position: dict(zip(element_ids, searched[position][1].elements.get_many(element_ids, include_code)))
+            for position, element_ids in by_repository.items()
+        }
+        return sum(len(repository_matches) for repository_matches in matches), [
+            {"repo_id": searched[position][0], **elements[position][element_id]}
+            for _, position, element_id in page
+        ]
     
-    for element in elements:
-        if (query_lower in element['name'].lower() or 
-            query_lower in element.get('docstring', '').lower() or
-            query_lower in element.get('code', '').lower()):
-            results.append(element)
+    # Ranking reads source files to confirm code hits; keep that off the event loop
+    loop = asyncio.get_event_loop()
+    total, results = await loop.run_in_executor(services.executor, search_page)
     
-    print(f"Search for '{q}' returned {len(results)} results")
-    return {"results": results[:20]}  # Limit results
+    return {
+        "results": results,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "repositories": [searched_id for searched_id, _ in searched],
+        # Requested repositories that are unknown or not parsed yet
+        "missing": missing,
+        # Results cover only the files parsed so far
+        "partial": any(services.repositories.get(searched_id, {}).get("status") != "ready" for searched_id, _ in searched)
+    }
 
-@app.get("/repositories/{repo_id}/debug")
-async def debug_repository(repo_id: str):
-    """Debug endpoint to see what was parsed"""
-    print(f"Debug request for repo {repo_id}")
+@router.get("/repositories/{repo_id}/snippet")
+async def get_snippet(
+    repo_id: str,
+    path: str,
+    start_line: int = Query(1, ge=1),
+    end_line: int = Query(None, ge=1),
+    services: AppServices = Depends(get_services)
+):
+    """Exact source lines start_line..end_line of a parsed file, read from the checkout"""
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Repository not found or not parsed")
+    
+    if end_line is None:
+        end_line = start_line
+    if end_line < start_line:
+        raise HTTPException(status_code=400, detail="end_line must not be before start_line")
+    end_line = min(end_line, start_line + SNIPPET_MAX_LINES - 1)
+    
+    snippet = loaded.elements.read_lines(path, start_line, end_line)
+    if snippet is None:
+        raise HTTPException(status_code=404, detail="File not found among parsed files")
+    return snippet._asdict()
+
+@router.get("/repositories/{repo_id}/symbols/{name}/usages")
+async def symbol_usages(
+    repo_id: str,
+    name: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    services: AppServices = Depends(get_services)
+):
+    """Where a symbol is defined, and a page of the calls, member accesses, imports and subclasses naming it"""
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Repository not found or not parsed")
     
-    if repo_id not in parsed_code:
-        print(f"Repository {repo_id} not found in parsed_code. Available: {list(parsed_code.keys())}")
-        return {"error": "Repository not found or not parsed", "available_repos": list(parsed_code.keys())}
+    total, usages = loaded.references.usages(name, offset, limit)
+    return {
+        "symbol": name,
+        "definitions": loaded.elements.get_many(loaded.references.definitions(name), with_code=False),
+        "usages": usages,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        # Usages cover only the files parsed so far
+        "partial": services.repositories.get(repo_id, {}).get("status") != "ready"
+    }
+
+@router.get("/repositories/{repo_id}/graph")
+async def import_graph(
+    repo_id: str,
+    path: str = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    services: AppServices = Depends(get_services)
+):
+    """Module import graph as adjacency lists; one file's imports and importers when path is given"""
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Repository not found or not parsed")
     
-    elements = parsed_code[repo_id]
+    # Built when parsing finishes; mid-parse it is rebuilt from the files so far
+    loop = asyncio.get_event_loop()
+    graph = await loop.run_in_executor(services.executor, loaded.references.graph)
+    partial = services.repositories.get(repo_id, {}).get("status") != "ready"
+    if path is not None:
+        module = graph.module(path)
+        if module is None:
+            raise HTTPException(status_code=404, detail="File not found among parsed files")
+        return {**module._asdict(), "partial": partial}
+    return {
+        "modules": [module._asdict() for module in graph.page(offset, limit)],
+        "total": len(graph),
+        "edge_count": graph.edge_count,
+        "offset": offset,
+        "limit": limit,
+        "partial": partial
+    }
+
+@router.get("/repositories/{repo_id}/debug")
+async def debug_repository(repo_id: str, services: AppServices = Depends(get_services)):
+    """Debug endpoint to see what was parsed"""
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
+        return {"error": "Repository not found or not parsed", "available_repos": services.repository_store.list_repositories()}
+    
+    elements = loaded.elements
+    summary = services.repository_summary(repo_id)
+    if summary is not None:
+        element_types = list(summary["elements_by_type"])
+        languages = list(summary["elements_by_language"])
+    else:
+        element_types = list(set(elements.column('type')))
+        languages = list(set(elements.column('language')))
     return {
         "total_elements": len(elements),
         "sample_elements": elements[:5],  # First 5 elements
-        "element_types": list(set(e['type'] for e in elements)) if elements else [],
-        "languages": list(set(e['language'] for e in elements)) if elements else []
+        "element_types": element_types,
+        "languages": languages
     }
 
-@app.get("/debug/repositories")
-async def list_repositories():
+@router.get("/debug/repositories")
+async def list_repositories(services: AppServices = Depends(get_services)):
     """List all repositories for debugging"""
     return {
-        "repositories": repositories,
-        "parsed_code_keys": list(parsed_code.keys())
+        "repositories": services.repositories,
+        "stored_repositories": services.repository_store.list_repositories(),
+        "parsed_code_keys": services.loaded_repos.keys(),
+        "parsed_code_bytes": services.loaded_repos.memory_usage(),
+        "parse_cache": services.parse_cache.stats(),
+        "stored_content": services.repository_store.content_stats(),
+        "answer_cache": services.answer_cache.stats()
     }
 
-@app.post("/query")
+@router.post("/query")
 async def query_codebase(request: QueryRequest):
     return {
         "query": request.query,
@@ -209,88 +682,161 @@ async def query_codebase(request: QueryRequest):
 class AskRequest(BaseModel):
     question: str
 
-@app.post("/repositories/{repo_id}/ask")
-async def ask_about_code(repo_id: str, request: AskRequest):
+def format_context_element(element):
+    """Compact prompt block for one element: where it is, what it is, and the head of its code"""
+    code = element['code']
+    if len(code) > ASK_SNIPPET_CHARS:
+        code = code[:ASK_SNIPPET_CHARS] + "..."
+    return f"{element['file_path']}:{element['start_line']} {element['type']} {element['name']}\n{code}"
+
+def element_names(elements, element_type: str, limit: int, keep=None):
+    """First names of elements of one type, in walk order, that pass keep"""
+    names = []
+    for name, kind in zip(elements.column('name'), elements.column('type')):
+        if kind == element_type and (keep is None or keep(name)):
+            names.append(name)
+            if len(names) == limit:
+                break
+    return names
+
+async def complete_answer(services: AppServices, context: str, question: str):
+    """One chat completion answering question from the given code context"""
+    response = await services.openai_client.chat.completions.create(
+        model=services.settings.openai_model,
+        messages=[
+            {
+                "role": "system", 
+                "content": "You are a code analysis assistant. Answer questions about the provided codebase clearly and concisely."
+            },
+            {
+                "role": "user", 
+                "content": f"Here's a codebase:\n\n{context}\n\nQuestion: {question}"
+            }
+        ],
+        max_tokens=500,
+        temperature=0.3
+    )
+    return response.choices[0].message.content
+
+@router.post("/repositories/{repo_id}/ask")
+async def ask_about_code(repo_id: str, request: AskRequest, services: AppServices = Depends(get_services)):
     """Ask natural language questions about the codebase"""
     question = request.question
-    print(f"AI query for repo {repo_id}: '{question}'")
+    logger.debug("AI query for repo %s: %r", repo_id, question)
     
-    if repo_id not in parsed_code:
+    loaded = await services.get_parsed(repo_id)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="Repository not found or not parsed")
     
-    elements = parsed_code[repo_id]
+    elements = loaded.elements
     
     if not elements:
         return {"answer": "No code elements found in this repository."}
     
-    # Analyze code structure for intelligent responses
-    functions = [e for e in elements if e['type'] == 'function']
-    classes = [e for e in elements if e['type'] == 'class']
-    languages = list(set(e['language'] for e in elements))
+    # The elements most relevant to the question, best first
+    hits = loaded.retrieval_index.search(question, services.settings.ask_context_elements)
+    context_elements = elements.get_many(element_id for element_id, _ in hits)
+    sources = [
+        {"name": e['name'], "file_path": e['file_path'], "start_line": e['start_line'], "score": round(score, 3)}
+        for e, (_, score) in zip(context_elements, hits)
+    ]
     
     # Use real OpenAI if available, otherwise use smart mock
-    if openai_client:  # Changed from 'client' to 'openai_client'
+    if services.openai_client:  # Changed from 'client' to 'openai_client'
         try:
-            # Create context from code elements
-            context_parts = []
-            for element in elements[:15]:
-                context_parts.append(
-                    f"File: {element['file_path']}\n"
-                    f"Type: {element['type']}\n"
-                    f"Name: {element['name']}\n"
-                    f"Code:\n{element['code'][:150]}...\n"
-                )
+            context = "\n---\n".join(format_context_element(element) for element in context_elements)
             
-            context = "\n---\n".join(context_parts)
-            
-            response = openai_client.chat.completions.create(  # Changed from 'client' to 'openai_client'
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a code analysis assistant. Answer questions about the provided codebase clearly and concisely."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"Here's a codebase:\n\n{context}\n\nQuestion: {question}"
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.3
+            # Same repository state, question and context give the same answer;
+            # identical questions asked concurrently share one upstream call
+            info = services.get_repository_info(repo_id) or {}
+            repo_state = f"{info.get('head')}:{len(elements)}"
+            answer, cache_status = await services.answer_cache.get_or_compute(
+                services.answer_cache.make_key(repo_state, question, context),
+                lambda: complete_answer(services, context, question)
             )
             
             return {
-                "answer": response.choices[0].message.content,
-                "context_elements": len(elements)
+                "answer": answer,
+                "context_elements": len(context_elements),
+                "sources": sources,
+                "cache": cache_status
             }
             
         except Exception as e:
-            print(f"OpenAI API error: {e}")
+            logger.warning("OpenAI API error: %s", e)
             # Fall back to mock if API fails
     
-    # Smart mock response based on actual code analysis
+    # Smart mock response based on actual code analysis; counts come from the
+    # parse-time summary, names are only looked up for answers that list them
+    summary = services.repository_summary(repo_id)
+    if summary is not None:
+        type_counts = summary["elements_by_type"]
+        languages = [language for language, _ in Counter(summary["elements_by_language"]).most_common()]
+    else:
+        type_counts = Counter(elements.column('type'))
+        languages = [language for language, _ in Counter(elements.column('language')).most_common()]
+    function_count = type_counts.get('function', 0)
+    class_count = type_counts.get('class', 0)
     question_lower = question.lower()
     
     if any(word in question_lower for word in ['what', 'does', 'do', 'purpose']):
-        main_functions = [f['name'] for f in functions[:3]]
-        answer = f"This is a {languages[0]} project with {len(functions)} functions and {len(classes)} classes. Key functions include: {', '.join(main_functions)}. It appears to be a library for handling HTTP requests and web functionality."
+        main_functions = [source['name'] for source in sources[:3]] or element_names(elements, 'function', 3)
+        answer = f"This is a {languages[0]} project with {function_count} functions and {class_count} classes. Key functions include: {', '.join(main_functions)}. It appears to be a library for handling HTTP requests and web functionality."
     elif any(word in question_lower for word in ['how many', 'count']):
-        answer = f"Code statistics:\n• {len(functions)} functions\n• {len(classes)} classes\n• {len(set(e['file_path'] for e in elements))} files\n• Language: {', '.join(languages)}"
+        answer = f"Code statistics:\n• {function_count} functions\n• {class_count} classes\n• {len(elements.file_paths)} files\n• Language: {', '.join(languages)}"
     elif any(word in question_lower for word in ['main', 'key', 'important']):
-        main_items = [f['name'] for f in functions if not f['name'].startswith('_')][:5]
-        answer = f"Key components:\n• Main functions: {', '.join(main_items)}\n• Classes: {', '.join([c['name'] for c in classes[:3]])}"
+        main_items = element_names(elements, 'function', 5, lambda name: not name.startswith('_'))
+        answer = f"Key components:\n• Main functions: {', '.join(main_items)}\n• Classes: {', '.join(element_names(elements, 'class', 3))}"
     elif any(word in question_lower for word in ['http', 'request', 'api']):
-        http_funcs = [f['name'] for f in functions if any(term in f['name'].lower() for term in ['get', 'post', 'request', 'http'])]
+        http_funcs = element_names(elements, 'function', 5, lambda name: any(term in name.lower() for term in ['get', 'post', 'request', 'http']))
         answer = f"HTTP-related functions found: {', '.join(http_funcs[:5]) if http_funcs else 'None detected'}"
     else:
         answer = f"I analyzed {len(elements)} code elements in this {languages[0]} codebase. Try asking: 'What does this do?', 'How many functions?', or 'What are the main components?'"
     
     return {
         "answer": answer + "\n\n(Using intelligent code analysis)",
-        "context_elements": len(elements)
+        "context_elements": len(context_elements),
+        "sources": sources
     }
 
 
+def create_app(settings: Settings = None) -> FastAPI:
+    """The API app; its services are built when it starts, not when this module is imported"""
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if settings is None:
+            load_dotenv()
+        # Per-file and per-request messages are DEBUG, so the default level skips
+        # them before any formatting happens
+        logging.basicConfig(
+            level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+        services = AppServices(settings or Settings.from_env())
+        await services.start()
+        app.state.services = services
+        try:
+            yield
+        finally:
+            await services.stop()
+
+    app = FastAPI(title="Repo Analyzer API", lifespan=lifespan)
+
+    # CORS middleware for frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(record_request_latency)
+    app.include_router(router)
+    return app
+
+app = create_app()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,51 +1,432 @@
+import io
+import logging
+import multiprocessing
 import re
+import threading
+import time
+import tokenize
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
+from services.file_classifier import SOURCE, classify_path, read_source
+from services.file_walker import MAX_FILE_SIZE, FileRecord, walk_repository
+from parsers.parse_cache import git_blob_sha
+from parsers.python_ast import parse_python_ast
+from parsers.js_scanner import is_bundled, scan_js_source
+
+logger = logging.getLogger(__name__)
+
+# JavaScript-family extension -> language reported for its elements
+JS_LANGUAGES = {
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.mjs': 'javascript',
+    '.cjs': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+}
+
+PARSED_EXTENSIONS = ('.py',) + tuple(JS_LANGUAGES)
+
+# Language of every parsed extension
+EXTENSION_LANGUAGES = {'.py': 'python', **JS_LANGUAGES}
+
+# Bump whenever parser output changes so cached results are not reused
+PARSER_VERSION = "7"
+
+# Universal newlines, matching how text-mode open() splits lines
+_NEWLINE = re.compile(rb'\r\n|\r|\n')
+
+def line_offsets(content):
+    """Byte offset where each line starts, plus the content length as a sentinel
+
+    Works on bytes and on mmap'd files; a file of n lines yields n + 1 offsets.
+    """
+    offsets = array('I', [0])
+    offsets.extend(match.end() for match in _NEWLINE.finditer(content))
+    if offsets[-1] != len(content):
+        offsets.append(len(content))
+    return offsets
+
+def line_span(content, offsets, start_line: int, end_line: int):
+    """Byte range of lines start_line..end_line, without the final line's newline"""
+    line_count = len(offsets) - 1
+    start = offsets[min(start_line, line_count + 1) - 1]
+    end = offsets[min(end_line, line_count)]
+    if end > start and content[end - 1:end] == b'\n':
+        end -= 1
+    if end > start and content[end - 1:end] == b'\r':
+        end -= 1
+    return start, end
+
+def _attach_code_spans(content: bytes, offsets, elements):
+    """Record each element's byte range in the raw file; snippets are read back from it on demand"""
+    for element in elements:
+        element['code_span'] = list(line_span(content, offsets, element['start_line'], element['end_line']))
+
+def decode_source(content: bytes, encoding: str = 'utf-8'):
+    """Text open(..., 'r', encoding, errors='ignore') would yield, newlines included"""
+    return content.decode(encoding, errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+def decode_python(content: bytes):
+    """Text of Python source in the encoding its BOM or coding cookie declares"""
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(content).readline)
+    except SyntaxError:
+        encoding = 'utf-8'
+    return decode_source(content, encoding)
+
+class ParsedFile(NamedTuple):
+    record: object
+    elements: list
+    line_count: int
+    # Start offset of every line, for serving snippets by line range
+    line_offsets: array = None
+    # Time spent parsing; None when the parse cache served the file
+    seconds: float = None
+    # {'imports': [[module, line]], 'references': [[name, line, kind]]};
+    # None for files the parsers skip
+    references: dict = None
+    # Anything but SOURCE when sniffing the file's head ruled out parsing it
+    category: str = SOURCE
+
+# Parser used inside worker processes, created on first chunk
+_worker_parser = None
+
+def _parse_chunk(files):
+    """Parse a chunk of (record, content or None to read it) in a worker process"""
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = CodeParser()
+    return [_worker_parser.parse_file(record, content) for record, content in files]
 
 class CodeParser:
-    def __init__(self):
-        print("Initialized simple regex-based code parser")
+    def __init__(self, workers: int = 1, chunk_size: int = 64, cache=None):
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.cache = cache
+        self._pool = None
+        # (parser key, blob sha) -> Future of the ParsedFile, for blobs another
+        # batch is parsing right now; repositories processed side by side, such
+        # as forks, wait for each other's results instead of parsing twice
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        logger.info("Initialized code parser: ast for Python, scanner for JavaScript/TypeScript (%d worker(s))", self.workers)
     
-    def parse_repository(self, repo_path: str):
-        """Parse all code files in repository using regex"""
-        print(f"Starting to parse repository: {repo_path}")
-        repo_path = Path(repo_path)
+    def parse_repository(self, repo_path: str, records=None, stats=None):
+        """Parse all code files in repository"""
         parsed_elements = []
+        for parsed_file in self.iter_parse_repository(repo_path, records, stats):
+            parsed_elements.extend(parsed_file.elements)
         
-        # Find Python files
-        python_files = list(repo_path.rglob("*.py"))
-        js_files = list(repo_path.rglob("*.js"))
+        logger.info("Total parsed elements: %d", len(parsed_elements))
+        return parsed_elements
+    
+    def iter_parse_repository(self, repo_path: str, records=None, stats=None):
+        """Yield a ParsedFile per code file, in walk order, as parsing progresses"""
+        logger.info("Starting to parse repository: %s", repo_path)
         
-        print(f"Found {len(python_files)} Python files and {len(js_files)} JS files")
+        # Reuse the caller's walk when given one
+        if records is None:
+            records = walk_repository(repo_path)
+        records = [record for record in records if record.extension in PARSED_EXTENSIONS]
+        # Binary, generated, vendored and large files are known from the walk
+        source = [record for record in records if record.category == SOURCE]
         
-        for file_path in python_files:
-            try:
-                elements = self.parse_python_file(file_path, repo_path)
-                parsed_elements.extend(elements)
-                if elements:
-                    print(f"Parsed {file_path.name}: found {len(elements)} elements")
-            except Exception as e:
-                print(f"Error parsing {file_path}: {e}")
-        
-        for file_path in js_files:
+        logger.info("Found %d Python/JS/TS files, %d of them source", len(records), len(source))
+        records = source
+        
+        if stats is not None:
+            stats.update({"hits": 0, "misses": 0, "shared": 0, "skipped": 0})
+        
+        # Work in batches big enough to keep every worker busy, so the first
+        # results stream out long before the whole repository is parsed
+        batch_size = self.chunk_size * self.workers * 4
+        for start in range(0, len(records), batch_size):
+            yield from self._parse_batch(records[start:start + batch_size], stats)
+    
+    def _parse_batch(self, records, stats):
+        """Parse one batch of records, serving unchanged blobs from the cache or from another batch parsing them"""
+        # Elements per record, filled from the cache first and then by parsing
+        results = [None] * len(records)
+        references = [None] * len(records)
+        contents = [None] * len(records)
+        blob_shas = [None] * len(records)
+        offsets = [None] * len(records)
+        categories = [SOURCE] * len(records)
+        
+        if self.cache is not None:
+            self._load_cached(records, results, references, contents, blob_shas, offsets, categories)
+        
+        pending = [i for i, elements in enumerate(results) if elements is None]
+        claimed, shared = self._claim(records, blob_shas, pending)
+        skipped = 0
+        try:
+            parsed = self._parse_records([records[i] for i in claimed], [contents[i] for i in claimed])
+            parsed = self._publish(records, blob_shas, claimed, parsed)
+            
+            # Parsed results arrive in claimed order, so cached, shared and
+            # parsed files can be yielded together in walk order
+            for i, record in enumerate(records):
+                if i in shared:
+                    future = shared[i]
+                    if not future.done():
+                        # Finish our own claims before blocking, so batches
+                        # waiting on each other cannot deadlock
+                        parsed = iter(list(parsed))
+                    parsed_file = self._shared_file(record, future.result(), contents[i])
+                    results[i] = parsed_file.elements
+                    references[i] = parsed_file.references
+                elif results[i] is None:
+                    parsed_file = next(parsed)
+                    results[i] = parsed_file.elements
+                    references[i] = parsed_file.references
+                else:
+                    line_count = len(offsets[i]) - 1 if offsets[i] is not None else 0
+                    parsed_file = ParsedFile(
+                        record, results[i], line_count, offsets[i], references=references[i], category=categories[i]
+                    )
+                if parsed_file.category != SOURCE:
+                    skipped += 1
+                yield parsed_file
+            
+            if self.cache is not None:
+                self._store_parsed(records, results, references, blob_shas, claimed)
+        finally:
+            self._release(records, blob_shas, claimed)
+        
+        # Files sniffed as not source before the cache lookup; without a cache
+        # the parser sniffs them instead and they count among the claimed
+        sniffed = sum(1 for category in categories if category != SOURCE)
+        hits = len(records) - len(pending) - sniffed
+        misses = len(claimed) - (skipped - sniffed)
+        if self.cache is not None:
+            self.cache.record(hits, misses)
+            logger.info("Parse cache: %d hits, %d misses, %d shared, %d skipped", hits, misses, len(shared), skipped)
+        
+        if stats is not None:
+            stats["hits"] += hits
+            stats["misses"] += misses
+            stats["shared"] += len(shared)
+            stats["skipped"] += skipped
+    
+    def parse_record(self, record, content: bytes = None):
+        """Parse a single walked file with the parser matching its extension"""
+        return self.parse_file(record, content).elements
+    
+    def parse_file(self, record, content: bytes = None):
+        """Parse a single walked file into a ParsedFile, indexing its lines on the way"""
+        started = time.perf_counter()
+        try:
+            if content is None:
+                # Binary, generated and minified files stop after their first bytes
+                category, content = read_source(record.path)
+                if content is None:
+                    logger.debug("Skipping %s file %s", category, record.relative_path)
+                    return ParsedFile(record, [], 0, None, time.perf_counter() - started, category=category)
+            offsets = line_offsets(content)
+            line_count = len(offsets) - 1
+            
+            references = {'imports': [], 'references': []}
+            if record.extension == '.py':
+                # The raw bytes, so ast.parse honours a BOM or coding cookie
+                elements = self.parse_python_source(content, record.relative_path, references)
+            elif record.extension in JS_LANGUAGES:
+                elements = self.parse_js_source(
+                    decode_source(content), record.relative_path, JS_LANGUAGES[record.extension], references
+                )
+            else:
+                return ParsedFile(record, [], line_count, offsets, time.perf_counter() - started)
+            if elements:
+                _attach_code_spans(content, offsets, elements)
+                logger.debug("Parsed %s: found %d elements", record.relative_path, len(elements))
+            return ParsedFile(record, elements, line_count, offsets, time.perf_counter() - started, references)
+        except Exception as e:
+            logger.warning("Error parsing %s: %s", record.path, e)
+            return ParsedFile(record, [], 0, None, time.perf_counter() - started)
+    
+    def close(self):
+        """Shut down the worker pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    
+    def _parse_records(self, records, contents):
+        """Parse records serially or across the worker pool, preserving order"""
+        # Contents the cache lookup already read travel with their records,
+        # so workers do not read those files a second time
+        chunks = self._chunk_records(list(zip(records, contents)))
+        
+        if self.workers > 1 and len(chunks) > 1:
+            # Chunks are contiguous and map() preserves their order, so the
+            # merged result matches the serial path exactly
+            for chunk_results in self._get_pool().map(_parse_chunk, chunks):
+                yield from chunk_results
+        else:
+            for record, content in zip(records, contents):
+                yield self.parse_file(record, content)
+    
+    def _load_cached(self, records, results, references, contents, blob_shas, offsets, categories):
+        """Sniff and hash each file, and fill results and references for blobs parsed by this parser version before
+
+        Files whose head shows they are not source get empty results and
+        their category, without being read in full.
+        """
+        for i, record in enumerate(records):
             try:
-                elements = self.parse_js_file(file_path, repo_path)
-                parsed_elements.extend(elements)
-                if elements:
-                    print(f"Parsed {file_path.name}: found {len(elements)} elements")
-            except Exception as e:
-                print(f"Error parsing {file_path}: {e}")
-        
-        print(f"Total parsed elements: {len(parsed_elements)}")
-        return parsed_elements
+                categories[i], contents[i] = read_source(record.path)
+            except OSError:
+                results[i] = []
+                continue
+            if contents[i] is None:
+                results[i] = []
+                continue
+            blob_shas[i] = git_blob_sha(contents[i])
+        
+        for extension in PARSED_EXTENSIONS:
+            parser_key = self._parser_key(extension)
+            cached = self.cache.get_many(
+                [blob_shas[i] for i, record in enumerate(records) if record.extension == extension and blob_shas[i]],
+                parser_key
+            )
+            for i, record in enumerate(records):
+                if record.extension == extension and blob_shas[i] in cached:
+                    # Cached results are path-free so identical blobs share entries
+                    entry = cached[blob_shas[i]]
+                    results[i] = [dict(element, file_path=record.relative_path) for element in entry['elements']]
+                    references[i] = entry['references']
+                    # Files still to parse are indexed by the parse itself
+                    offsets[i] = line_offsets(contents[i])
+                    contents[i] = None
+    
+    def _store_parsed(self, records, results, references, blob_shas, parsed):
+        """Write freshly parsed blobs to the cache; files that failed to parse are retried next time"""
+        by_key = {}
+        for i in parsed:
+            if blob_shas[i] is None or references[i] is None:
+                continue
+            elements = [{k: v for k, v in element.items() if k != 'file_path'} for element in results[i]]
+            entry = {'elements': elements, 'references': references[i]}
+            by_key.setdefault(self._parser_key(records[i].extension), []).append((blob_shas[i], entry))
+        for parser_key, items in by_key.items():
+            self.cache.put_many(items, parser_key)
+    
+    def _claim(self, records, blob_shas, pending):
+        """Split pending records into ones this batch parses and {index: Future} of ones already in flight"""
+        claimed = []
+        shared = {}
+        with self._in_flight_lock:
+            for i in pending:
+                if blob_shas[i] is None:
+                    claimed.append(i)
+                    continue
+                key = (self._parser_key(records[i].extension), blob_shas[i])
+                future = self._in_flight.get(key)
+                if future is None:
+                    self._in_flight[key] = Future()
+                    claimed.append(i)
+                else:
+                    # Also catches a blob repeated within this batch
+                    shared[i] = future
+        return claimed, shared
+    
+    def _publish(self, records, blob_shas, claimed, parsed):
+        """Pass parsed files through, resolving the futures other batches wait on"""
+        for i, parsed_file in zip(claimed, parsed):
+            if blob_shas[i] is not None:
+                with self._in_flight_lock:
+                    future = self._in_flight.get((self._parser_key(records[i].extension), blob_shas[i]))
+                future.set_result(parsed_file)
+            yield parsed_file
+    
+    def _release(self, records, blob_shas, claimed):
+        """Drop this batch's claims once its results are cached; waiters on unfinished ones parse for themselves"""
+        with self._in_flight_lock:
+            for i in claimed:
+                if blob_shas[i] is None:
+                    continue
+                future = self._in_flight.pop((self._parser_key(records[i].extension), blob_shas[i]), None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+    
+    def _shared_file(self, record, parsed_file, content):
+        """ParsedFile for record from another file with the same blob, or parsed here if that one failed"""
+        if parsed_file is None or parsed_file.line_offsets is None:
+            return self.parse_file(record, content)
+        elements = [dict(element, file_path=record.relative_path) for element in parsed_file.elements]
+        # Same blob, same lines
+        return ParsedFile(record, elements, parsed_file.line_count, parsed_file.line_offsets, references=parsed_file.references)
+    
+    def _parser_key(self, extension: str):
+        return f"{PARSER_VERSION}{extension}"
+    
+    def _get_pool(self):
+        """Create the worker pool on first parallel parse
+
+        The pool starts from a parse thread of a multi-threaded server, so
+        workers come from a fresh forkserver (spawn where there is none)
+        rather than a fork that could inherit a lock another thread holds.
+        """
+        if self._pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._pool
+    
+    def _chunk_records(self, files):
+        """Split (record, content) pairs into contiguous chunks of roughly equal total size"""
+        # Several chunks per worker so one slow chunk does not hold up the rest;
+        # a file larger than the budget gets a chunk to itself
+        byte_budget = max(1, sum(record.size for record, _ in files) // (self.workers * 4))
+        
+        chunks = []
+        chunk, chunk_bytes = [], 0
+        for record, content in files:
+            if chunk and (len(chunk) >= self.chunk_size or chunk_bytes + record.size > byte_budget):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append((record, content))
+            chunk_bytes += record.size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
     
     def parse_python_file(self, file_path: Path, repo_root: Path):
-        """Simple regex-based Python parsing"""
+        """Parse a Python file from disk, unless it is binary, generated, vendored or minified"""
+        return self.parse_path(file_path, repo_root)
+    
+    def parse_path(self, file_path: Path, repo_root: Path):
+        """Parse one file from disk the way a walked repository's files are parsed"""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-        except:
+            relative_path = file_path.relative_to(repo_root).as_posix()
+        except ValueError:
+            relative_path = file_path.name
+        try:
+            size = file_path.stat().st_size
+        except OSError:
             return []
-        
+        category = classify_path(relative_path, file_path.suffix)
+        if category != SOURCE or size > MAX_FILE_SIZE:
+            return []
+        return self.parse_record(FileRecord(str(file_path), relative_path, size, file_path.suffix, category))
+    
+    def parse_python_source(self, content, relative_path: str, references=None):
+        """Parse Python source, falling back to regex if it does not compile
+
+        content is text, or raw bytes decoded as their BOM or coding cookie
+        says. The regex fallback records no references, so references stays
+        empty then.
+        """
+        try:
+            return parse_python_ast(content, relative_path, references)
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            logger.debug("Falling back to regex parser for %s: %s", relative_path, e.__class__.__name__)
+            if isinstance(content, bytes):
+                content = decode_python(content)
+            return self.parse_python_regex(content, relative_path)
+    
+    def parse_python_regex(self, content: str, relative_path: str):
+        """Regex-based Python parsing of already decoded source"""
         elements = []
         lines = content.split('\n')
         
@@ -63,21 +444,13 @@ class CodeParser:
                 
                 # Find end of function (simple approach - next 10 lines or less)
                 end_line = min(i + 10, len(lines))
-                code_snippet = '\n'.join(lines[i:end_line])
-                
-                # Try to get relative path from repo root
-                try:
-                    relative_path = file_path.relative_to(repo_root)
-                except:
-                    relative_path = file_path.name
                 
                 elements.append({
                     'type': 'function',
                     'name': func_name,
-                    'file_path': str(relative_path),
+                    'file_path': relative_path,
                     'start_line': i + 1,
                     'end_line': end_line,
-                    'code': code_snippet,
                     'docstring': self._extract_python_docstring(lines, i),
                     'language': 'python'
                 })
@@ -86,20 +459,13 @@ class CodeParser:
             class_match = re.match(r'^(\s*)class\s+(\w+)', line)
             if class_match:
                 class_name = class_match.group(2)
-                code_snippet = '\n'.join(lines[i:min(i + 5, len(lines))])
-                
-                try:
-                    relative_path = file_path.relative_to(repo_root)
-                except:
-                    relative_path = file_path.name
                 
                 elements.append({
                     'type': 'class',
                     'name': class_name,
-                    'file_path': str(relative_path),
+                    'file_path': relative_path,
                     'start_line': i + 1,
                     'end_line': min(i + 5, len(lines)),
-                    'code': code_snippet,
                     'docstring': self._extract_python_docstring(lines, i),
                     'language': 'python'
                 })
@@ -107,13 +473,18 @@ class CodeParser:
         return elements
     
     def parse_js_file(self, file_path: Path, repo_root: Path):
-        """Simple regex-based JavaScript parsing"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-        except:
+        """Parse a JavaScript/TypeScript file from disk, unless it is binary, generated, vendored or minified"""
+        return self.parse_path(file_path, repo_root)
+    
+    def parse_js_source(self, content: str, relative_path: str, language: str = 'javascript', references=None):
+        """Parse already decoded JavaScript/TypeScript, skipping minified and vendored bundles"""
+        if is_bundled(relative_path, content):
+            logger.debug("Skipping bundled or minified file %s", relative_path)
             return []
-        
+        return scan_js_source(content, relative_path, language, references)
+    
+    def parse_js_regex(self, content: str, relative_path: str):
+        """Previous line-by-line regex scanner, kept as a benchmark baseline"""
         elements = []
         lines = content.split('\n')
         
@@ -140,15 +511,10 @@ class CodeParser:
             if func_name:
                 code_snippet = '\n'.join(lines[i:min(i + 8, len(lines))])
                 
-                try:
-                    relative_path = file_path.relative_to(repo_root)
-                except:
-                    relative_path = file_path.name
-                
                 elements.append({
                     'type': 'function',
                     'name': func_name,
-                    'file_path': str(relative_path),
+                    'file_path': relative_path,
                     'start_line': i + 1,
                     'end_line': min(i + 8, len(lines)),
                     'code': code_snippet,
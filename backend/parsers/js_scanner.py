@@ -0,0 +1,247 @@
+import re
+from bisect import bisect_left, bisect_right
+
+from services.file_classifier import SOURCE, classify_path, looks_minified
+
+_IDENTIFIER = r'[A-Za-z_$][\w$]*'
+# Arrow function parameters: one identifier or an unnested list on one line.
+# Every repetition is bounded by a delimiter so long lines cannot backtrack
+_ARROW = r'(?:\([^()\n]*\)|' + _IDENTIFIER + r')\s*(?::[^=;{}\n]*)?=>'
+
+# Every definition form in one alternation, run once over the whole buffer
+_DEFINITION = re.compile(r'''
+    (?<![\w$.])(?P<fn_async>async\s+)?function\b\s*\*?\s*(?P<function>{id})\s*[(<]
+  | (?<![\w$.])class\s+(?P<class>{id})
+  | (?<![\w$.])(?:const|let|var)\s+(?P<variable>{id})\s*(?::[^=;\n]*)?=\s*
+        (?P<var_async>async\s+)?(?:function\b|{arrow})
+  | (?<![\w$])(?P<key>{id})\s*:\s*(?P<key_async>async\s+)?(?:function\b|{arrow})
+  | (?<![\w$.:])(?:{id}\.)*(?P<assigned>{id})[ \t]*=[ \t]*(?P<assign_async>async\s+)?(?:function\b|{arrow})
+  | ^[ \t]+(?:(?:public|private|protected|static|readonly|override|abstract|get|set)[ \t]+)*
+        (?P<method_async>async[ \t]+)?\*?(?P<method>{id})\s*(?:<[^<>\n]*>)?\([^()\n]*\)\s*(?::[^;{{}}\n]*)?\{{
+'''.format(id=_IDENTIFIER, arrow=_ARROW), re.MULTILINE | re.VERBOSE)
+
+# Comments, string literals and braces; everything else is skipped
+_TOKEN = re.compile(r'''
+    (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*[\s\S]*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+  | (?P<brace>[{}])
+''', re.VERBOSE)
+
+# Module specifiers of import/export ... from, side-effect imports, require() and import()
+# The clause starts and ends on a non-space, so the whitespace around it splits only one way
+_IMPORT = re.compile(r'''
+    (?<![\w$.])(?:import|export)\s+(?:type\s+)?(?P<clause>[\w$*{},](?:[\w$*{},\s]*?[\w$*{},])?)\s*from\s*(?P<from>"[^"\n]*"|'[^'\n]*')
+  | (?<![\w$.])import\s*(?P<bare>"[^"\n]*"|'[^'\n]*')
+  | (?<![\w$.])(?:require|import)\s*\(\s*(?P<dynamic>"[^"\n]*"|'[^'\n]*')\s*\)
+''', re.VERBOSE)
+
+# Member accesses, plain calls and base classes, matched against the source
+# with comments and strings blanked out
+_MEMBER = re.compile(r'\.[ \t]*(' + _IDENTIFIER + r')([ \t]*\()?')
+_CALL = re.compile(r'(?<![\w$.])(' + _IDENTIFIER + r')[ \t]*\(')
+_EXTENDS = re.compile(r'\bextends\s+(?:' + _IDENTIFIER + r'\.)*(' + _IDENTIFIER + ')')
+
+# Call-like keywords and the module loaders, which _IMPORT already covers
+_NOT_CALLS = {
+    'if', 'for', 'while', 'switch', 'catch', 'with', 'return', 'function', 'typeof', 'await', 'new',
+    'do', 'else', 'async', 'import', 'require', 'super', 'void', 'delete', 'in', 'of', 'yield'
+}
+
+# Definition kind -> the group that captured its async keyword
+_ASYNC_GROUPS = {
+    'function': 'fn_async',
+    'class': None,
+    'variable': 'var_async',
+    'key': 'key_async',
+    'assigned': 'assign_async',
+    'method': 'method_async',
+}
+
+# Call-like lines the method alternative would otherwise pick up
+_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'with', 'return', 'function', 'do', 'else', 'typeof', 'await', 'new'}
+
+# How far a definition may be from its opening brace before it is treated as bodiless
+_MAX_HEADER_LINES = 5
+_MAX_HEADER_CHARS = 2000
+# Fallback snippet length when the braces do not balance
+_FALLBACK_LINES = 8
+
+
+def is_bundled(relative_path: str, content: str):
+    """Heuristic for minified, bundled or vendored JavaScript
+
+    The walker's classification covers the path; this also checks the whole
+    text, catching bundles whose first bytes still look like source.
+    """
+    if classify_path(relative_path) != SOURCE:
+        return True
+    return looks_minified(content)
+
+
+def scan_js_source(content: str, relative_path: str, language: str = 'javascript', references=None):
+    """Extract classes, functions and methods from JavaScript/TypeScript in one pass
+
+    When given a references dict, also fills its 'imports' and 'references'
+    from the same buffer, reusing the comment and string spans.
+    """
+    line_breaks = [match.start() for match in re.finditer('\n', content)]
+    brace_pairs, opening_braces, doc_comments, skipped = _match_braces(content)
+    doc_ends = [end for end, _ in doc_comments]
+    skipped_starts = [start for start, _ in skipped]
+
+    elements = []
+    # Offsets of defined names, which look like calls to the reference scan
+    definition_starts = set()
+    # (closing brace offset, name) of the classes enclosing the current position
+    classes = []
+    for match in _DEFINITION.finditer(content):
+        kind = next(kind for kind in _ASYNC_GROUPS if match.group(kind))
+        name = match.group(kind)
+        if kind == 'method' and name in _KEYWORDS:
+            continue
+
+        start = match.start(kind)
+        # Commented-out or quoted code is not a definition
+        index = bisect_right(skipped_starts, start) - 1
+        if index >= 0 and start < skipped[index][1]:
+            continue
+        while classes and classes[-1][0] < start:
+            classes.pop()
+        definition_starts.add(start)
+
+        start_line = bisect_left(line_breaks, start) + 1
+        body_end = _body_end(content, match.end(), brace_pairs, opening_braces)
+        if body_end is None:
+            end_line = min(start_line + _FALLBACK_LINES - 1, len(line_breaks) + 1)
+        else:
+            end_line = bisect_left(line_breaks, body_end) + 1
+
+        element = {
+            'type': 'class' if kind == 'class' else 'function',
+            'name': name,
+            'file_path': relative_path,
+            'start_line': start_line,
+            'end_line': end_line,
+            'docstring': _doc_comment(content, line_breaks, start_line, doc_ends, doc_comments),
+            'language': language
+        }
+        if classes:
+            element['parent'] = classes[-1][1]
+        if kind != 'class':
+            element['is_async'] = bool(match.group(_ASYNC_GROUPS[kind]))
+        elements.append(element)
+
+        if kind == 'class' and body_end is not None:
+            classes.append((body_end, name))
+
+    if references is not None:
+        _collect_references(content, line_breaks, skipped, skipped_starts, definition_starts, references)
+    return elements
+
+
+def _collect_references(content: str, line_breaks, skipped, skipped_starts, definition_starts, references):
+    """Module specifiers as written, and the names this file calls, reads as members, imports or extends"""
+    def in_skipped(offset):
+        index = bisect_right(skipped_starts, offset) - 1
+        return index >= 0 and offset < skipped[index][1]
+
+    imports = references['imports']
+    found = {}
+    for match in _IMPORT.finditer(content):
+        if in_skipped(match.start()):
+            continue
+        specifier = match.group('from') or match.group('bare') or match.group('dynamic')
+        line = bisect_left(line_breaks, match.start()) + 1
+        imports.append([specifier[1:-1], line])
+        for name in _imported_names(match.group('clause') or ''):
+            found[(name, line, 'import')] = None
+
+    code = _blank(content, skipped)
+    for match in _MEMBER.finditer(code):
+        found[(match.group(1), bisect_left(line_breaks, match.start(1)) + 1, 'call' if match.group(2) else 'attribute')] = None
+    for match in _CALL.finditer(code):
+        if match.group(1) not in _NOT_CALLS and match.start(1) not in definition_starts:
+            found[(match.group(1), bisect_left(line_breaks, match.start(1)) + 1, 'call')] = None
+    for match in _EXTENDS.finditer(code):
+        found[(match.group(1), bisect_left(line_breaks, match.start(1)) + 1, 'inherit')] = None
+    # Each scan runs in offset order; merge them back into line order
+    references['references'].extend([name, line, kind] for name, line, kind in sorted(found, key=lambda ref: ref[1]))
+
+
+def _blank(content: str, skipped):
+    """content with the skipped spans replaced by spaces, keeping offsets and line breaks"""
+    parts = []
+    last = 0
+    for start, end in skipped:
+        span = content[start:end]
+        parts.append(content[last:start])
+        parts.append(re.sub(r'[^\n]', ' ', span) if '\n' in span else ' ' * len(span))
+        last = end
+    parts.append(content[last:])
+    return ''.join(parts)
+
+
+def _imported_names(clause: str):
+    """Exported names an import clause binds: `React, { useState as s }` -> React, useState"""
+    for part in re.split(r'[{},]', clause):
+        words = part.split()
+        if words and words[0] == 'type':
+            words = words[1:]
+        if words and words[0] != '*' and not words[0].startswith('*'):
+            yield words[0]
+
+
+def _match_braces(content: str):
+    """Pair up braces outside comments and strings in a single token pass
+
+    Returns ({open offset: close offset}, sorted open offsets, [(end, text)]
+    of /** doc comments */, [(start, end)] of every comment and string).
+    """
+    pairs = {}
+    opening = []
+    doc_comments = []
+    skipped = []
+    stack = []
+    for match in _TOKEN.finditer(content):
+        if match.lastgroup == 'brace':
+            if match.group() == '{':
+                stack.append(match.start())
+                opening.append(match.start())
+            elif stack:
+                pairs[stack.pop()] = match.start()
+            continue
+        skipped.append(match.span())
+        if match.lastgroup == 'block_comment' and match.group().startswith('/**'):
+            doc_comments.append((match.end(), match.group()))
+    return pairs, opening, doc_comments, skipped
+
+
+def _body_end(content: str, header_end: int, brace_pairs, opening_braces):
+    """Offset of the closing brace of the body that follows a definition header"""
+    # Method headers end on their opening brace
+    if content[header_end - 1] == '{':
+        return brace_pairs.get(header_end - 1)
+
+    index = bisect_left(opening_braces, header_end)
+    if index == len(opening_braces) or opening_braces[index] - header_end > _MAX_HEADER_CHARS:
+        return header_end
+    brace = opening_braces[index]
+    # Expression-bodied arrows and declarations have no braces of their own
+    between = content[header_end:brace]
+    if ';' in between or between.count('\n') > _MAX_HEADER_LINES or '=>' in between:
+        return header_end
+    return brace_pairs.get(brace)
+
+
+def _doc_comment(content: str, line_breaks, start_line: int, doc_ends, doc_comments):
+    """Text of a /** */ comment ending on the line above the definition"""
+    line_start = line_breaks[start_line - 2] + 1 if start_line > 1 else 0
+    index = bisect_right(doc_ends, line_start) - 1
+    if index < 0:
+        return ''
+    end, text = doc_comments[index]
+    if content[end:line_start].strip():
+        return ''
+    body = (line.strip().lstrip('*').strip() for line in text[3:-2].split('\n'))
+    return ' '.join(line for line in body if line)
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def git_blob_sha(content: bytes):
+    """SHA-1 of content as git hashes a blob, so keys match `git ls-files -s`"""
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+class ParseCache:
+    """Persistent cache of parse results keyed by content hash and parser version"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parsed_blobs ("
+                " blob_sha TEXT NOT NULL,"
+                " parser_key TEXT NOT NULL,"
+                " elements TEXT NOT NULL,"
+                " PRIMARY KEY (blob_sha, parser_key)"
+                ") WITHOUT ROWID"
+            )
+
+    def get_many(self, blob_shas, parser_key: str):
+        """Return {blob_sha: result} for the blobs already parsed under parser_key"""
+        blob_shas = list(set(blob_shas))
+        found = {}
+        with self._lock:
+            for start in range(0, len(blob_shas), _LOOKUP_BATCH):
+                batch = blob_shas[start:start + _LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT blob_sha, elements FROM parsed_blobs"
+                    f" WHERE parser_key = ? AND blob_sha IN ({placeholders})",
+                    [parser_key, *batch]
+                )
+                for blob_sha, elements in rows:
+                    found[blob_sha] = json.loads(elements)
+        return found
+
+    def put_many(self, items, parser_key: str):
+        """Store (blob_sha, result) pairs parsed under parser_key; results are any JSON value"""
+        rows = [(blob_sha, parser_key, json.dumps(elements)) for blob_sha, elements in items]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO parsed_blobs (blob_sha, parser_key, elements) VALUES (?, ?, ?)",
+                rows
+            )
+
+    def record(self, hits: int, misses: int):
+        """Add one parse run's lookups to the running counters"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,146 @@
+import ast
+import threading
+import warnings
+
+# ast.parse is not safe to run from several threads at once before Python
+# 3.12 ("AST constructor recursion depth mismatch"); jobs parsing side by side
+# in-process take turns. Parsing is CPU-bound under the GIL anyway, so this
+# costs little.
+_PARSE_LOCK = threading.Lock()
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+# Compound statements whose blocks can hold nested definitions; simple
+# statements and expressions are never descended into
+_COMPOUND = tuple(
+    getattr(ast, name) for name in (
+        'If', 'For', 'AsyncFor', 'While', 'Try', 'TryStar', 'With', 'AsyncWith',
+        'Match', 'match_case', 'ExceptHandler'
+    ) if hasattr(ast, name)
+)
+_BLOCK_FIELDS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+
+def parse_python_ast(content, relative_path: str, references=None):
+    """Extract classes and functions from Python source with exact spans
+
+    content is text or raw bytes; ast.parse decodes bytes by their BOM or
+    coding cookie, as the interpreter would. Raises SyntaxError (or
+    ValueError for null bytes) when the source does not parse, so callers
+    can fall back to the regex scanner. When given a references dict, also
+    fills its 'imports' and 'references' from the same tree.
+    """
+    with _PARSE_LOCK, warnings.catch_warnings():
+        # Invalid escape sequences and the like are not our concern here
+        warnings.simplefilter('ignore')
+        tree = ast.parse(content, filename=relative_path)
+
+    elements = []
+    _visit(tree, None, relative_path, elements)
+    if references is not None:
+        _collect_references(tree, references)
+    return elements
+
+
+def _visit(node, parent, relative_path, elements):
+    """Walk the statement tree once, emitting an element per definition"""
+    for field in _BLOCK_FIELDS:
+        block = getattr(node, field, None)
+        if not isinstance(block, list):
+            continue
+        for child in block:
+            if isinstance(child, _DEFINITIONS):
+                qualname = f"{parent}.{child.name}" if parent else child.name
+                # Skip private methods and magic methods for cleaner results
+                if not child.name.startswith('_') or isinstance(child, ast.ClassDef):
+                    elements.append(_element(child, parent, relative_path))
+                _visit(child, qualname, relative_path, elements)
+            elif isinstance(child, _COMPOUND):
+                _visit(child, parent, relative_path, elements)
+
+
+def _element(node, parent, relative_path):
+    is_class = isinstance(node, ast.ClassDef)
+    # The span starts at the first decorator so the snippet shows it
+    start_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+    end_line = node.end_lineno
+
+    element = {
+        'type': 'class' if is_class else 'function',
+        'name': node.name,
+        'file_path': relative_path,
+        'start_line': start_line,
+        'end_line': end_line,
+        'docstring': ast.get_docstring(node) or '',
+        'language': 'python'
+    }
+    if parent:
+        element['parent'] = parent
+    if node.decorator_list:
+        element['decorators'] = [ast.unparse(decorator) for decorator in node.decorator_list]
+    if not is_class:
+        element['is_async'] = isinstance(node, ast.AsyncFunctionDef)
+    return element
+
+
+def _collect_references(tree, references):
+    """Imports as dotted module paths, and the names this file calls, reads as attributes, imports or subclasses
+
+    Imports are [module, line]; a from-import lists each imported name under
+    its module, and the graph falls back to the module when the name is not a
+    submodule. References are [name, line, kind] in line order. The tree is
+    walked with an explicit stack and dispatched on node type, which is
+    several times cheaper than ast.walk with isinstance checks.
+    """
+    imports = references['imports']
+    found = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is ast.Attribute:
+            if type(node.ctx) is ast.Load:
+                found.add((node.attr, node.lineno, 'attribute'))
+            stack.append(node.value)
+        elif kind is ast.Call:
+            _add_target(node.func, 'call', found, stack)
+            stack.extend(node.args)
+            stack.extend(node.keywords)
+        elif kind is ast.Name or kind is ast.Constant:
+            continue
+        elif kind is ast.Import:
+            imports.extend([alias.name, node.lineno] for alias in node.names)
+        elif kind is ast.ImportFrom:
+            module = '.' * node.level + (node.module or '')
+            for alias in node.names:
+                if alias.name == '*':
+                    imports.append([module, node.lineno])
+                    continue
+                imports.append([f"{module}.{alias.name}" if node.module else module + alias.name, node.lineno])
+                found.add((alias.name, node.lineno, 'import'))
+        else:
+            for field, value in node.__dict__.items():
+                if type(value) is list:
+                    if field == 'decorator_list':
+                        for decorator in value:
+                            _add_target(decorator, 'decorator', found, stack)
+                    elif field == 'bases' and kind is ast.ClassDef:
+                        for base in value:
+                            _add_target(base, 'inherit', found, stack)
+                    else:
+                        stack.extend(item for item in value if isinstance(item, ast.AST))
+                elif isinstance(value, ast.AST) and not isinstance(value, ast.expr_context):
+                    stack.append(value)
+    imports.sort(key=lambda item: item[1])
+    references['references'].extend([name, line, kind] for name, line, kind in sorted(found, key=lambda ref: (ref[1], ref[0], ref[2])))
+
+
+def _add_target(node, kind, found, stack):
+    """Record the name a call, decorator or base class refers to, and keep walking below it"""
+    if type(node) is ast.Name:
+        found.add((node.id, node.lineno, kind))
+    elif type(node) is ast.Attribute:
+        found.add((node.attr, node.lineno, kind))
+        stack.append(node.value)
+    else:
+        stack.append(node)
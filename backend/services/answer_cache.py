@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """TTL/LRU cache of generated answers that coalesces identical in-flight requests"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires at, answer), least recently used first
+        self._entries = OrderedDict()
+        # key -> task computing the answer; every waiter shares it
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(repo_state: str, question: str, context: str):
+        """Key for an answer to question about one repository state, given the context sent"""
+        normalized = " ".join(question.lower().split()).rstrip("?!. ")
+        return hashlib.sha256("\0".join((repo_state, normalized, context)).encode()).hexdigest()
+
+    async def get_or_compute(self, key: str, compute):
+        """Return (answer, source), source being "hit", "coalesced" or "miss"
+
+        compute is a coroutine function, called only when no fresh answer is
+        cached and none is already being computed for key.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], "hit"
+            del self._entries[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            source = "miss"
+            # A task of its own, so one client disconnecting does not cancel
+            # the call the others are waiting on
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            source = "coalesced"
+        return await asyncio.shield(task), source
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _finish(self, key: str, task):
+        """Cache a successful answer; failures are retried by the next request"""
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
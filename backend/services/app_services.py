@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+from typing import NamedTuple
+
+from parsers.code_parser import CodeParser
+from parsers.parse_cache import ParseCache
+from services.answer_cache import AnswerCache
+from services.job_scheduler import JobScheduler
+from services.metrics import MetricsRegistry, TrackedThreadPoolExecutor, LATENCY_BUCKETS, STAGE_BUCKETS
+from services.repo_service import RepositoryService
+from services.repository_store import SQLiteRepositoryStore, LoadedRepositories
+
+logger = logging.getLogger(__name__)
+
+
+class Settings(NamedTuple):
+    """Server configuration, read from the environment when the app starts"""
+    repos_dir: str = "./repos"
+    repository_db: str = None  # Defaults to repositories.sqlite under repos_dir
+    clone_depth: int = 1
+    clone_blob_filter: str = None
+    parse_workers: int = os.cpu_count() or 1
+    parse_chunk_size: int = 64
+    repo_memory_budget_mb: int = 512
+    job_workers: int = 3
+    job_queue_size: int = 32
+    clone_workers: int = 4
+    parse_job_workers: int = 2
+    job_timeout_seconds: float = 1800
+    ask_cache_size: int = 1024
+    ask_cache_ttl_seconds: float = 3600
+    ask_context_elements: int = 6
+    openai_api_key: str = None
+    openai_base_url: str = None
+    openai_model: str = "gpt-3.5-turbo"
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Settings with each field overridden by its upper-case environment variable"""
+        values = {}
+        for field, default in cls._field_defaults.items():
+            value = environ.get(field.upper())
+            if value:
+                values[field] = type(default)(value) if default is not None else value
+        return cls(**values)
+
+
+class AppServices:
+    """The services every request shares, built once per app when it starts"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.repo_service = RepositoryService(
+            depth=settings.clone_depth,
+            blob_filter=settings.clone_blob_filter,
+            repos_dir=settings.repos_dir
+        )
+        self.parse_cache = ParseCache(self.repo_service.repos_dir / "parse_cache.sqlite")
+        self.code_parser = CodeParser(
+            workers=settings.parse_workers,
+            chunk_size=settings.parse_chunk_size,
+            cache=self.parse_cache
+        )
+        self.repository_store = SQLiteRepositoryStore(
+            settings.repository_db or self.repo_service.repos_dir / "repositories.sqlite"
+        )
+        self.loaded_repos = LoadedRepositories(
+            self.repository_store,
+            memory_budget=settings.repo_memory_budget_mb * 1024 * 1024
+        )
+        self.scheduler = JobScheduler(
+            workers=settings.job_workers,
+            max_queue=settings.job_queue_size,
+            clone_workers=settings.clone_workers,
+            parse_workers=settings.parse_job_workers,
+            job_timeout=settings.job_timeout_seconds
+        )
+        # Short request-time work such as loading a stored repository
+        self.executor = TrackedThreadPoolExecutor(max_workers=3, thread_name_prefix="request")
+        self.answer_cache = AnswerCache(
+            max_entries=settings.ask_cache_size,
+            ttl=settings.ask_cache_ttl_seconds
+        )
+        # Metadata of repositories touched since startup; repository_store has the rest
+        self.repositories = {}
+        # Summaries still being accumulated, by repo_id; finished ones live in the metadata
+        self.live_stats = {}
+        self._openai_client = None
+        self._openai_checked = False
+        self._register_metrics()
+
+    async def start(self):
+        await self.scheduler.start()
+
+    async def stop(self):
+        await self.scheduler.stop()
+        self.executor.shutdown(wait=False)
+        self.code_parser.close()
+
+    @property
+    def openai_client(self):
+        """AsyncOpenAI client, imported and built on the first /ask; None without an API key"""
+        if not self._openai_checked:
+            self._openai_checked = True
+            if not self.settings.openai_api_key:
+                logger.warning("No OpenAI API key found - using mock responses")
+                return None
+            try:
+                from openai import AsyncOpenAI
+                # openai_base_url points the client at a compatible server or a local stub
+                self._openai_client = AsyncOpenAI(
+                    api_key=self.settings.openai_api_key,
+                    base_url=self.settings.openai_base_url
+                )
+                logger.info("OpenAI client initialized")
+            except Exception as e:
+                logger.error("Error initializing OpenAI client: %s", e)
+        return self._openai_client
+
+    def get_repository_info(self, repo_id: str):
+        """Repository metadata, loaded from the store on first access"""
+        if repo_id not in self.repositories:
+            info = self.repository_store.load_repository(repo_id)
+            if info is None:
+                return None
+            if info["status"] in ("queued", "cloning", "parsing"):
+                # Saved queued or mid-processing by a server that has since stopped
+                info["status"] = "error"
+                info["error"] = "Processing was interrupted by a server restart"
+            self.repositories[repo_id] = info
+        return self.repositories[repo_id]
+
+    def save_repository_info(self, repo_id: str):
+        self.repository_store.save_repository(repo_id, self.repositories[repo_id])
+
+    def repository_summary(self, repo_id: str):
+        """Finished or in-progress summary of a repository; None if it predates summaries"""
+        stats = self.live_stats.get(repo_id)
+        if stats is not None:
+            return stats.summary()
+        info = self.get_repository_info(repo_id)
+        return info.get("stats") if info else None
+
+    async def get_parsed(self, repo_id: str):
+        """ParsedRepository for repo_id, loading it lazily; None if not parsed"""
+        loaded = self.loaded_repos.peek(repo_id)
+        if loaded is not None:
+            return loaded
+
+        info = self.get_repository_info(repo_id)
+        if info is None or "repo_path" not in info:
+            return None
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._load_parsed, repo_id, info)
+
+    def _load_parsed(self, repo_id: str, info: dict):
+        """Load a stored repository, first putting its checkout back at the commit its spans point into
+
+        A re-parse moves the checkout to the new commit before its elements
+        are stored; if it failed, snippets sliced from the moved files would
+        be wrong. The checkout is left alone while a job is working in it.
+        """
+        head = self.repository_store.load_head(repo_id)
+        if head is not None and self.scheduler.in_flight(info.get("normalized_url")) is None:
+            try:
+                self.repo_service.restore_checkout(info["repo_path"], head)
+            except Exception as e:
+                logger.warning("Could not restore %s to %s: %s", info["repo_path"], head, e)
+        return self.loaded_repos.get(repo_id, info["repo_path"])
+
+    def _register_metrics(self):
+        """Served at /metrics; gauges are read from the services when scraped"""
+        metrics = self.metrics = MetricsRegistry()
+        scheduler, loaded_repos, answer_cache = self.scheduler, self.loaded_repos, self.answer_cache
+        executors = {"clone": scheduler.clone_executor, "parse": scheduler.parse_executor, "request": self.executor}
+        self.stage_seconds = metrics.histogram(
+            "repo_analyzer_stage_seconds", "Duration of each repository processing stage", ("stage",), STAGE_BUCKETS
+        )
+        self.parse_file_seconds = metrics.histogram(
+            "repo_analyzer_parse_file_seconds", "Time to parse one file, by language", ("language",), LATENCY_BUCKETS
+        )
+        self.parsed_files = metrics.counter(
+            "repo_analyzer_parsed_files_total", "Files parsed, served from the parse cache or skipped by their first bytes", ("language", "source")
+        )
+        self.parsed_bytes = metrics.counter(
+            "repo_analyzer_parsed_bytes_total", "Bytes of source parsed or served from the parse cache", ("language",)
+        )
+        self.repositories_processed = metrics.counter(
+            "repo_analyzer_repositories_processed_total", "Finished processing jobs by outcome", ("outcome",)
+        )
+        self.request_seconds = metrics.histogram(
+            "repo_analyzer_request_seconds", "HTTP request latency by route", ("method", "route", "status"), LATENCY_BUCKETS
+        )
+        metrics.gauge("repo_analyzer_job_queue_depth", "Jobs waiting for a worker", collect=lambda: scheduler.queue_depth())
+        metrics.gauge(
+            "repo_analyzer_jobs_running", "Jobs being processed",
+            collect=lambda: sum(1 for job in list(scheduler.jobs.values()) if job.status == "running")
+        )
+        metrics.gauge(
+            "repo_analyzer_executor_active_threads", "Executor threads running work", ("executor",),
+            collect=lambda: {(name,): pool.active for name, pool in executors.items()}
+        )
+        metrics.gauge(
+            "repo_analyzer_executor_pending_tasks", "Work queued for an executor thread", ("executor",),
+            collect=lambda: {(name,): pool.pending for name, pool in executors.items()}
+        )
+        metrics.gauge(
+            "repo_analyzer_executor_utilization", "Fraction of executor threads busy", ("executor",),
+            collect=lambda: {(name,): pool.utilization() for name, pool in executors.items()}
+        )
+        metrics.gauge("repo_analyzer_loaded_repositories", "Repositories held in memory", collect=lambda: len(loaded_repos.keys()))
+        metrics.gauge("repo_analyzer_loaded_elements", "Code elements held in memory", collect=lambda: loaded_repos.element_count())
+        metrics.gauge("repo_analyzer_loaded_bytes", "Approximate bytes of parsed repositories held in memory", collect=lambda: loaded_repos.memory_usage())
+        metrics.counter(
+            "repo_analyzer_answer_cache_requests_total", "/ask answers by cache outcome", ("result",),
+            collect=lambda: {(result,): answer_cache.stats()[key] for result, key in (("hit", "hits"), ("miss", "misses"), ("coalesced", "coalesced"))}
+        )
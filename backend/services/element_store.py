@@ -0,0 +1,227 @@
+import mmap
+import os
+import sys
+from array import array
+from typing import NamedTuple
+
+from parsers.code_parser import line_offsets, line_span
+
+# Fields every parser emits, in the order elements are served
+CORE_FIELDS = ('type', 'name', 'file_path', 'start_line', 'end_line', 'code', 'docstring', 'language')
+
+
+class Snippet(NamedTuple):
+    file_path: str
+    start_line: int
+    end_line: int
+    line_count: int
+    code: str
+
+
+class ElementStore:
+    """Column store for the parsed code elements of one repository
+
+    Line numbers and snippet byte spans live in typed arrays, file paths in a
+    per-file table and repeated strings are interned. Snippets are sliced from
+    the mmap'd source file when an element is materialized, and arbitrary line
+    ranges through a per-file index of line offsets.
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = os.fspath(repo_path)
+        self.file_paths = []
+        self._file_ids = {}
+        # file id -> start offset of every line, from the parser or built on first read
+        self._line_offsets = {}
+
+        self._types = []
+        self._names = []
+        self._docstrings = []
+        self._languages = []
+        self._file_index = array('I')
+        self._start_lines = array('I')
+        self._end_lines = array('I')
+        self._span_starts = array('Q')
+        self._span_ends = array('Q')
+        # Parser-specific fields, as key -> column padded with None
+        self._extras = {}
+        # Columns are appended one by one; readers only look below this count
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self.get(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.get_many(range(*index.indices(self._count)))
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("element index out of range")
+        return self.get(index)
+
+    def add_file(self, file_path: str, offsets=None):
+        """Register a source file, with the line offsets its parser computed if any"""
+        file_id = self._file_ids.get(file_path)
+        if file_id is None:
+            file_id = self._file_ids[file_path] = len(self.file_paths)
+            self.file_paths.append(sys.intern(file_path))
+        if offsets is not None:
+            self._line_offsets[file_id] = offsets
+        return file_id
+
+    def extend(self, elements):
+        """Append parsed element dicts; their snippets stay in the source file"""
+        for element in elements:
+            file_id = self.add_file(element['file_path'])
+
+            self._types.append(sys.intern(element['type']))
+            self._names.append(sys.intern(element['name']))
+            # Interned too, so forks loaded side by side share their docstrings
+            self._docstrings.append(sys.intern(element.get('docstring') or ''))
+            self._languages.append(sys.intern(element['language']))
+            self._file_index.append(file_id)
+            self._start_lines.append(element['start_line'])
+            self._end_lines.append(element['end_line'])
+            span_start, span_end = element['code_span']
+            self._span_starts.append(span_start)
+            self._span_ends.append(span_end)
+
+            for key, value in element.items():
+                if key in CORE_FIELDS or key == 'code_span':
+                    continue
+                column = self._extras.get(key)
+                if column is None:
+                    column = self._extras[key] = [None] * self._count
+                column.append(value)
+            for column in self._extras.values():
+                if len(column) == self._count:
+                    column.append(None)
+
+            self._count += 1
+
+    def column(self, field: str):
+        """Values of one field for every element, without materializing elements"""
+        count = self._count
+        if field == 'type':
+            return self._types[:count]
+        if field == 'name':
+            return self._names[:count]
+        if field == 'docstring':
+            return self._docstrings[:count]
+        if field == 'language':
+            return self._languages[:count]
+        if field == 'file_path':
+            return [self.file_paths[file_id] for file_id in self._file_index[:count]]
+        if field == 'start_line':
+            return self._start_lines[:count].tolist()
+        if field == 'end_line':
+            return self._end_lines[:count].tolist()
+        if field in self._extras:
+            return self._extras[field][:count]
+        raise KeyError(field)
+
+    def get(self, index: int, with_code: bool = True):
+        """Materialize one element as the dict the API serves"""
+        code = self.get_codes([index])[index] if with_code else None
+        return self._materialize(index, code)
+
+    def get_many(self, indexes, with_code: bool = True):
+        """Materialize several elements, reading each source file once"""
+        indexes = list(indexes)
+        codes = self.get_codes(indexes) if with_code else {}
+        return [self._materialize(index, codes.get(index)) for index in indexes]
+
+    def iter_elements(self, with_code: bool = False):
+        """Materialize every element; snippets are skipped unless asked for"""
+        for index in range(self._count):
+            yield self.get(index, with_code)
+
+    def iter_records(self):
+        """Yield elements in the shape extend() accepts, for persisting the store"""
+        for index in range(self._count):
+            element = self._materialize(index, None)
+            element['code_span'] = [self._span_starts[index], self._span_ends[index]]
+            yield element
+
+    def get_codes(self, indexes):
+        """Return {index: snippet} for indexes, grouped so each file is mapped once"""
+        by_file = {}
+        for index in indexes:
+            by_file.setdefault(self._file_index[index], []).append(index)
+
+        codes = {}
+        for file_id, file_indexes in by_file.items():
+            spans = [(index, self._span_starts[index], self._span_ends[index]) for index in file_indexes]
+            for index, data in self._read_spans(self.file_paths[file_id], spans):
+                codes[index] = data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        return codes
+
+    def read_lines(self, file_path: str, start_line: int, end_line: int):
+        """Snippet of lines start_line..end_line of a stored file, or None if the file is unknown
+
+        end_line is clamped to the file's length.
+        """
+        file_id = self._file_ids.get(file_path)
+        if file_id is None:
+            return None
+        try:
+            with open(os.path.join(self.repo_path, file_path), 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    offsets = self._line_offsets.get(file_id)
+                    if offsets is None:
+                        offsets = self._line_offsets[file_id] = line_offsets(mapped)
+                    line_count = len(offsets) - 1
+                    end_line = min(end_line, line_count)
+                    start, end = line_span(mapped, offsets, start_line, end_line)
+                    data = mapped[start:end] if start_line <= end_line else b''
+        except (OSError, ValueError):
+            # Missing or emptied file
+            line_count, end_line, data = 0, 0, b''
+        code = data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        return Snippet(self.file_paths[file_id], start_line, end_line, line_count, code)
+
+    def memory_usage(self):
+        """Approximate bytes held by the columns and the strings they own"""
+        total = sum(sys.getsizeof(column) for column in (
+            self._types, self._names, self._docstrings, self._languages, self.file_paths,
+            self._file_index, self._start_lines, self._end_lines, self._span_starts, self._span_ends
+        ))
+        total += sum(sys.getsizeof(value) for value in self._names)
+        total += sum(sys.getsizeof(value) for value in self._docstrings if value)
+        total += sum(sys.getsizeof(value) for value in self.file_paths)
+        total += sum(sys.getsizeof(column) for column in self._extras.values())
+        total += sum(sys.getsizeof(offsets) for offsets in self._line_offsets.values())
+        return total
+
+    def _materialize(self, index: int, code):
+        element = {
+            'type': self._types[index],
+            'name': self._names[index],
+            'file_path': self.file_paths[self._file_index[index]],
+            'start_line': self._start_lines[index],
+            'end_line': self._end_lines[index],
+        }
+        if code is not None:
+            element['code'] = code
+        element['docstring'] = self._docstrings[index]
+        element['language'] = self._languages[index]
+        # A snapshot, since extend on the parsing thread may add a column meanwhile
+        for key, column in tuple(self._extras.items()):
+            if column[index] is not None:
+                element[key] = column[index]
+        return element
+
+    def _read_spans(self, relative_path: str, spans):
+        """Return [(index, bytes)] for each (index, start, end) span of a checked-out file"""
+        try:
+            with open(os.path.join(self.repo_path, relative_path), 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return [(index, mapped[start:end]) for index, start, end in spans]
+        except (OSError, ValueError):
+            # Missing or emptied file: the snippet is gone with it
+            return [(index, b'') for index, _, _ in spans]
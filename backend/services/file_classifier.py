@@ -0,0 +1,362 @@
+import re
+
+# What a walked file is; only SOURCE files are parsed
+SOURCE = 'source'
+BINARY = 'binary'
+GENERATED = 'generated'
+MINIFIED = 'minified'
+VENDORED = 'vendored'
+LARGE = 'large'
+CATEGORIES = (SOURCE, BINARY, GENERATED, MINIFIED, VENDORED, LARGE)
+
+# Bytes sniffed from the head of a file; git looks this far for a NUL byte
+SNIFF_BYTES = 8000
+
+# Third-party code checked into the repository, by directory name
+_VENDORED_DIRS = {
+    'vendor', 'vendors', 'third_party', 'third-party', 'bower_components', 'jspm_packages', 'site-packages'
+}
+# Build output, by directory name
+_GENERATED_DIRS = {'dist'}
+_MINIFIED_SUFFIXES = ('.min.js', '.min.mjs', '.min.cjs', '.min.css', '.bundle.js', '-bundle.js', '.chunk.js')
+_GENERATED_SUFFIXES = (
+    '_pb2.py', '_pb2_grpc.py', '.pb.go', '.pb.js', '_pb.js', '_pb.d.ts', '.js.map', '.css.map',
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Cargo.lock',
+)
+_BINARY_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp', '.tiff', '.psd',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.jar', '.war', '.whl', '.egg',
+    '.so', '.dll', '.dylib', '.exe', '.o', '.a', '.lib', '.class', '.wasm', '.bin',
+    '.pdf', '.woff', '.woff2', '.ttf', '.otf', '.eot', '.mp3', '.mp4', '.mov', '.avi', '.wav', '.ogg',
+    '.sqlite', '.db', '.pkl', '.npy', '.npz', '.parquet',
+}
+
+# Phrases code generators put in the comment a file opens with
+_GENERATED_MARKER = re.compile(
+    rb'@generated\b|DO NOT EDIT|(?i:code generated by|generated by the protocol buffer compiler'
+    rb'|(?:auto-?generated|automatically generated|generated automatically) (?:by|from|with|using|file))'
+)
+# How far into a file its header comment is looked for
+_MARKER_BYTES = 2048
+_MARKER_LINES = 40
+_COMMENT_PREFIXES = (b'#', b'//', b'/*', b'*', b'--', b'<!--', b';')
+# Minified output packs a whole module onto a few lines
+_MINIFIED_MIN_BYTES = 1024
+_MINIFIED_AVERAGE_LINE = 200
+
+# .gitattributes attribute -> category it marks a file as
+_ATTRIBUTES = {'linguist-generated': GENERATED, 'linguist-vendored': VENDORED, 'binary': BINARY}
+_CATEGORY_ATTRIBUTES = {category: attribute for attribute, category in _ATTRIBUTES.items()}
+
+
+def classify_path(relative_path: str, extension: str = None):
+    """Category implied by a file's name and directories alone"""
+    parts = relative_path.replace('\\', '/').split('/')
+    if extension is None:
+        extension = '.' + parts[-1].rsplit('.', 1)[-1] if '.' in parts[-1] else ''
+    if extension.lower() in _BINARY_EXTENSIONS:
+        return BINARY
+    if parts[-1].endswith(_MINIFIED_SUFFIXES):
+        return MINIFIED
+    if parts[-1].endswith(_GENERATED_SUFFIXES):
+        return GENERATED
+    for part in parts[:-1]:
+        if part in _VENDORED_DIRS:
+            return VENDORED
+        if part in _GENERATED_DIRS:
+            return GENERATED
+    return SOURCE
+
+
+def sniff(head: bytes):
+    """Category of a file from its first SNIFF_BYTES: binary, generated, minified or source"""
+    if b'\0' in head:
+        return BINARY
+    if _GENERATED_MARKER.search(_header_comment(head)):
+        return GENERATED
+    if looks_minified(head):
+        return MINIFIED
+    return SOURCE
+
+
+def looks_minified(content):
+    """Whether content, bytes or text, packs its lines the way minified output does"""
+    newline = b'\n' if isinstance(content, bytes) else '\n'
+    return len(content) >= _MINIFIED_MIN_BYTES and len(content) / (content.count(newline) + 1) > _MINIFIED_AVERAGE_LINE
+
+
+def _header_comment(head: bytes):
+    """The comment lines a file opens with, up to its first line of code
+
+    Markers are only trusted there, as linguist does; the same words in a
+    docstring or string literal further down say nothing about the file.
+    """
+    lines = []
+    in_block = False
+    for line in head[:_MARKER_BYTES].split(b'\n')[:_MARKER_LINES]:
+        line = line.strip()
+        if not in_block and line and not line.startswith(_COMMENT_PREFIXES):
+            break
+        lines.append(line)
+        if in_block or line.startswith((b'/*', b'<!--')):
+            in_block = b'*/' not in line and b'-->' not in line
+    return b'\n'.join(lines)
+
+
+def read_source(path: str):
+    """(category, content) of a file, reading it in full only when its head says it is source
+
+    Binary, generated and minified files cost one SNIFF_BYTES read and come
+    back with content None.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        category = sniff(head)
+        if category != SOURCE:
+            return category, None
+        return category, head + f.read()
+
+
+def git_ignored(rules, relative_path: str, is_dir: bool):
+    """Whether the nearest of rules (GitRules, root first) with a matching .gitignore pattern ignores relative_path"""
+    for git_rules in reversed(rules):
+        ignored = git_rules.ignored(relative_path, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def git_category(rules, relative_path: str, default: str):
+    """Category .gitattributes give relative_path, else default
+
+    An attribute explicitly unset, such as -linguist-generated, overrides a
+    default that came from the path heuristics for the same category.
+    """
+    decided = set()
+    for git_rules in reversed(rules):
+        category = git_rules.category(relative_path, decided)
+        if category is not None:
+            return category
+    if _CATEGORY_ATTRIBUTES.get(default) in decided:
+        return SOURCE
+    return default
+
+
+class GitRules:
+    """Patterns of one directory's .gitignore and .gitattributes
+
+    Patterns are matched against paths relative to that directory with git's
+    wildmatch rules: a pattern without an inner slash matches a name at any
+    depth, a trailing slash matches directories only, and the last matching
+    pattern wins. Consecutive patterns of the same shape with at most one
+    wildcard are joined into one regex, so a file costs a few matches however
+    long the files are; patterns with more, which a cloned repository could
+    craft to make a regex backtrack for minutes, go through _Wildmatch.
+    """
+
+    def __init__(self, base: str, ignore_lines=(), attribute_lines=()):
+        # Directory of the files, relative to the repository root ('' at the root)
+        self.base = base
+        # [(negated, directories only, anchored, match function)], in file order;
+        # joinable patterns are held as regex source until all are read
+        self._ignore = []
+        for line in ignore_lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated or line.startswith('\\'):
+                line = line[1:]
+            directory_only = line.endswith('/')
+            tokens, anchored = _translate(line.rstrip('/'))
+            pattern = _Wildmatch(tokens) if _wildcards(tokens) > 1 else _regex(tokens)
+            previous = self._ignore[-1] if self._ignore else None
+            if (isinstance(pattern, str) and previous is not None and isinstance(previous[3], str)
+                    and previous[:3] == (negated, directory_only, anchored)):
+                self._ignore.pop()
+                pattern = f"{previous[3]}|{pattern}"
+            self._ignore.append((negated, directory_only, anchored, pattern))
+        self._ignore = [(negated, directory_only, anchored, _match_function(pattern))
+                        for negated, directory_only, anchored, pattern in self._ignore]
+
+        # [(anchored, match function, attribute name, category or None if unset)], in file order
+        self._attributes = []
+        for line in attribute_lines:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            for attribute in fields[1:]:
+                category = _attribute_category(attribute)
+                if category is False:
+                    continue
+                tokens, anchored = _translate(fields[0])
+                pattern = _Wildmatch(tokens) if _wildcards(tokens) > 1 else _regex(tokens)
+                name = attribute.lstrip('-').partition('=')[0]
+                self._attributes.append((anchored, _match_function(pattern), name, category))
+
+    def __bool__(self):
+        return bool(self._ignore or self._attributes)
+
+    def ignored(self, relative_path: str, is_dir: bool):
+        """True or False if a pattern decides relative_path, else None"""
+        path, name = self._relative(relative_path)
+        for negated, directory_only, anchored, match in reversed(self._ignore):
+            if directory_only and not is_dir:
+                continue
+            if match(path if anchored else name):
+                return not negated
+        return None
+
+    def category(self, relative_path: str, decided: set):
+        """Category the attributes give relative_path, skipping attributes in decided and adding those matched"""
+        path, name = self._relative(relative_path)
+        for anchored, match, attribute, category in reversed(self._attributes):
+            if attribute in decided or not match(path if anchored else name):
+                continue
+            decided.add(attribute)
+            if category is not None:
+                return category
+        return None
+
+    def _relative(self, relative_path: str):
+        path = relative_path.replace('\\', '/')
+        if self.base:
+            path = path[len(self.base) + 1:]
+        return path, path.rsplit('/', 1)[-1]
+
+
+def _attribute_category(attribute: str):
+    """Category set by an attribute such as linguist-generated, None if it unsets one, False if irrelevant"""
+    if attribute.startswith('!'):
+        return False
+    unset = attribute.startswith('-')
+    name, _, value = attribute.lstrip('-').partition('=')
+    if name not in _ATTRIBUTES:
+        return False
+    if unset or value.lower() == 'false':
+        return None
+    return _ATTRIBUTES[name]
+
+
+class _Wildmatch:
+    """Whole-path match of translated pattern tokens without backtracking
+
+    Tracks every token position the path could have reached so far, so a
+    match costs at most tokens x characters steps however the wildcards are
+    stacked.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def __call__(self, path: str):
+        tokens = self.tokens
+        end = len(tokens)
+        positions = self._closure({0})
+        for char in path:
+            following = set()
+            for position in positions:
+                if position == end:
+                    continue
+                kind, value = tokens[position]
+                if kind == _CHAR:
+                    if char == value:
+                        following.add(position + 1)
+                elif kind == _PATH:
+                    following.add(position)
+                elif kind == _DIRECTORIES:
+                    following.add(position)
+                    if char == '/':
+                        following.add(position + 1)
+                elif char != '/':
+                    if kind == _NAME:
+                        following.add(position)
+                    elif kind == _ONE or value.fullmatch(char):
+                        following.add(position + 1)
+            if not following:
+                return False
+            positions = self._closure(following)
+        return end in positions
+
+    def _closure(self, positions):
+        """positions plus those reachable by letting wildcards match nothing"""
+        pending = list(positions)
+        while pending:
+            position = pending.pop()
+            if position < len(self.tokens) and self.tokens[position][0] in _WILDCARDS and position + 1 not in positions:
+                positions.add(position + 1)
+                pending.append(position + 1)
+        return positions
+
+
+# Pattern token kinds: one literal character, ?, a [class], *, ** and **/
+_CHAR, _ONE, _CLASS, _NAME, _PATH, _DIRECTORIES = range(6)
+_WILDCARDS = (_NAME, _PATH, _DIRECTORIES)
+_TOKEN_REGEX = {_ONE: '[^/]', _NAME: '[^/]*', _PATH: '.*', _DIRECTORIES: '(?:.*/)?'}
+
+
+def _translate(pattern: str):
+    """([(kind, value)] tokens, anchored) for a gitignore-style pattern
+
+    Runs of wildcards collapse into one where they match the same paths, so
+    a line of repeated **/ costs no more than a single one.
+    """
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            token = (_DIRECTORIES, None)
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            tokens.append((_CHAR, '/'))
+            token = (_PATH, None)
+            i += 3
+        elif pattern.startswith('**', i):
+            token = (_PATH, None)
+            i += 2
+        elif pattern[i] == '*':
+            token = (_NAME, None)
+            i += 1
+        elif pattern[i] == '?':
+            token = (_ONE, None)
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            token = (_CLASS, f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            token = (_CHAR, pattern[i])
+            i += 1
+
+        previous = tokens[-1][0] if tokens else None
+        if token[0] in _WILDCARDS and previous in _WILDCARDS:
+            if token[0] == previous or previous == _PATH:
+                continue
+            if token[0] == _PATH:
+                tokens.pop()
+        tokens.append(token)
+    return [(kind, re.compile(value) if kind == _CLASS else value) for kind, value in tokens], anchored
+
+
+def _wildcards(tokens):
+    return sum(1 for kind, _ in tokens if kind in _WILDCARDS)
+
+
+def _regex(tokens):
+    """Regex source of tokens, safe to backtrack over when they hold at most one wildcard"""
+    return ''.join(
+        re.escape(value) if kind == _CHAR else value.pattern if kind == _CLASS else _TOKEN_REGEX[kind]
+        for kind, value in tokens
+    )
+
+
+def _match_function(pattern):
+    """Whole-path match function of a _Wildmatch or of joined regex source"""
+    if isinstance(pattern, _Wildmatch):
+        return pattern
+    return re.compile(f"(?:{pattern})").fullmatch
@@ -0,0 +1,91 @@
+import os
+from typing import NamedTuple
+
+from services.file_classifier import GitRules, LARGE, SOURCE, classify_path, git_category, git_ignored
+
+# Directories that are never descended into
+IGNORED_DIRS = {'.git', '__pycache__', 'node_modules', '.env'}
+IGNORED_FILES = {'.env'}
+IGNORED_EXTENSIONS = ('.pyc', '.log', '.tmp')
+MAX_FILE_SIZE = 1024 * 1024  # Files > 1MB are listed as large and never read
+
+
+class FileRecord(NamedTuple):
+    path: str
+    relative_path: str
+    size: int
+    extension: str
+    # One of file_classifier.CATEGORIES, from the path and .gitattributes;
+    # the parser refines source files by sniffing their first bytes
+    category: str = SOURCE
+
+
+def walk_repository(repo_path: str, max_file_size: int = MAX_FILE_SIZE):
+    """Walk a checkout once, yielding a classified FileRecord per file not ignored
+
+    .gitignore files prune what they match, and .gitattributes files mark
+    linguist-generated, linguist-vendored and binary paths, each for the
+    directory it sits in and everything below.
+    """
+    repo_path = os.fspath(repo_path)
+    # (absolute dir, path relative to repo root, GitRules of it and its parents);
+    # visited depth-first in name order
+    pending = [(repo_path, '', ())]
+
+    while pending:
+        dir_path, relative_dir, rules = pending.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        rules = _with_git_rules(dir_path, relative_dir, entries, rules)
+
+        subdirs = []
+        for entry in entries:
+            relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # Prune before descending instead of filtering every file below
+                    if entry.name not in IGNORED_DIRS and not git_ignored(rules, relative_path, True):
+                        subdirs.append((entry.path, relative_path, rules))
+                    continue
+                if not entry.is_file() or _is_ignored_file(entry.name) or git_ignored(rules, relative_path, False):
+                    continue
+                # DirEntry caches this stat, so each file costs at most one syscall
+                size = entry.stat().st_size
+            except OSError:
+                continue
+
+            extension = os.path.splitext(entry.name)[1]
+            category = git_category(rules, relative_path, classify_path(relative_path, extension))
+            if category == SOURCE and size > max_file_size:
+                category = LARGE
+            yield FileRecord(entry.path, relative_path, size, extension, category)
+
+        pending.extend(reversed(subdirs))
+
+
+def _with_git_rules(dir_path: str, relative_dir: str, entries, rules):
+    """rules extended with the .gitignore and .gitattributes among entries, if any"""
+    lines = {}
+    for entry in entries:
+        if entry.name in ('.gitignore', '.gitattributes'):
+            try:
+                with open(entry.path, encoding='utf-8', errors='ignore') as f:
+                    lines[entry.name] = f.readlines()
+            except OSError:
+                continue
+    if not lines:
+        return rules
+    git_rules = GitRules(relative_dir.replace(os.sep, '/'), lines.get('.gitignore', ()), lines.get('.gitattributes', ()))
+    return rules + (git_rules,) if git_rules else rules
+
+
+def _is_ignored_file(name: str):
+    """Skip secrets and build/log artifacts by file name"""
+    return (
+        name in IGNORED_FILES or
+        name.startswith('.env.') or
+        name.endswith(IGNORED_EXTENSIONS)
+    )
@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import threading
+import time
+
+from services.metrics import TrackedThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job's work once the job has been cancelled or timed out"""
+
+
+class Job:
+    def __init__(self, job_id: str, key: str, run, priority: int, on_cancel=None):
+        self.job_id = job_id
+        self.key = key
+        self.priority = priority
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._run = run
+        # Called with the job if it is cancelled before run ever starts
+        self._on_cancel = on_cancel
+        self._task = None
+        # Checked by work running in executor threads, which asyncio cannot interrupt
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Stop work in a worker thread once the job is cancelled or timed out"""
+        if self._cancel_event.is_set():
+            raise JobCancelledError(f"Job {self.job_id} was {self.status}")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "key": self.key,
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobScheduler:
+    """Bounded priority queue of repository jobs with separate clone and parse pools"""
+
+    def __init__(self, workers: int = 3, max_queue: int = 32, clone_workers: int = 4,
+                 parse_workers: int = 2, job_timeout: float = 1800, max_history: int = 1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.max_history = max_history
+        # Clones wait on the network, parses on the CPU; separate pools keep
+        # a burst of slow clones from queueing parses behind them
+        self.clone_executor = TrackedThreadPoolExecutor(max_workers=clone_workers, thread_name_prefix="clone")
+        self.parse_executor = TrackedThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix="parse")
+        self.jobs = {}
+        self._in_flight = {}
+        self._sequence = itertools.count(1)
+        self._queue = None
+        # Jobs still waiting to run; cancelled ones stay in the queue until a
+        # worker pops them, so capacity is checked against this instead
+        self._queued = 0
+        self._worker_tasks = []
+
+    @property
+    def running(self):
+        return bool(self._worker_tasks)
+
+    def queue_depth(self):
+        return self._queued
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for job in list(self._in_flight.values()):
+            self.cancel(job.job_id)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self.clone_executor.shutdown(wait=False, cancel_futures=True)
+        self.parse_executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, key: str, run, priority: int = 0, on_cancel=None):
+        """Queue run(job) under key, or return the job already in flight for key
+
+        Higher priorities run first; equal priorities run in submission order.
+        on_cancel(job) is called if the job is cancelled while still queued,
+        since run never gets to clean up after it. Raises QueueFullError when
+        the queue is at capacity.
+        """
+        existing = self._in_flight.get(key)
+        if existing is not None:
+            return existing
+
+        if self._queued >= self.max_queue:
+            raise QueueFullError(f"{self.max_queue} jobs already queued")
+
+        sequence = next(self._sequence)
+        job = Job(f"job_{sequence}", key, run, priority, on_cancel)
+        self._queue.put_nowait((-priority, sequence, job))
+        self._queued += 1
+
+        self.jobs[job.job_id] = job
+        self._in_flight[key] = job
+        self._prune_history()
+        return job
+
+    def in_flight(self, key: str):
+        """The queued or running job for key, or None"""
+        return self._in_flight.get(key)
+
+    def cancel(self, job_id: str):
+        """Cancel a queued or running job; returns False if it already finished"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        self._finish(job, "cancelled")
+        if job._task is not None:
+            job._task.cancel()
+        return True
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.status != "queued":
+                    continue  # Cancelled while waiting
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        self._queued -= 1
+        job._task = asyncio.create_task(job._run(job))
+        try:
+            done, _ = await asyncio.wait({job._task}, timeout=self.job_timeout)
+        except asyncio.CancelledError:
+            # The worker itself is shutting down
+            self.cancel(job.job_id)
+            raise
+
+        if not done:
+            # Mark first so the job sees why it is being cancelled
+            self._finish(job, "timeout", f"Timed out after {self.job_timeout}s")
+            job._task.cancel()
+            await asyncio.gather(job._task, return_exceptions=True)
+            return
+
+        try:
+            job._task.result()
+            self._finish(job, "done")
+        except (asyncio.CancelledError, JobCancelledError):
+            self._finish(job, "cancelled")
+        except Exception as e:
+            self._finish(job, "failed", str(e))
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        if job.status not in ("queued", "running"):
+            return
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job._cancel_event.set()
+        if self._in_flight.get(job.key) is job:
+            del self._in_flight[job.key]
+        if job.started_at is None:
+            self._queued -= 1
+            if job._on_cancel is not None:
+                job._on_cancel(job)
+
+    def _prune_history(self):
+        """Forget the oldest finished jobs beyond max_history"""
+        excess = len(self.jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at is not None][:excess]:
+            del self.jobs[job_id]
@@ -0,0 +1,255 @@
+import os
+import posixpath
+import sys
+import threading
+from array import array
+from typing import NamedTuple
+
+# Reference kinds, stored by position
+KINDS = ('call', 'attribute', 'import', 'inherit', 'decorator')
+_KIND_IDS = {kind: index for index, kind in enumerate(KINDS)}
+
+# Tried in order after an extensionless relative JavaScript/TypeScript import
+_JS_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs')
+
+
+class ModuleImports(NamedTuple):
+    """One file's edges in the import graph"""
+    path: str
+    # Repository files it imports, and the ones importing it
+    imports: list
+    imported_by: list
+    # Modules it imports from outside the parsed files, as named in the source
+    external: list
+
+
+class ImportGraph:
+    """Module import graph of one repository as adjacency lists in both directions"""
+
+    def __init__(self, paths, imports, imported_by, external):
+        self.paths = paths
+        self._ids = {path: file_id for file_id, path in enumerate(paths)}
+        self._imports = imports
+        self._imported_by = imported_by
+        self._external = external
+        self.edge_count = sum(len(targets) for targets in imports)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def module(self, path: str):
+        """Edges of the file at path, or None if it was not parsed"""
+        file_id = self._ids.get(path)
+        return None if file_id is None else self._module(file_id)
+
+    def page(self, offset: int, limit: int):
+        """Edges of the files offset..offset + limit, in walk order"""
+        return [self._module(file_id) for file_id in range(offset, min(offset + limit, len(self.paths)))]
+
+    def _module(self, file_id: int):
+        return ModuleImports(
+            self.paths[file_id],
+            [self.paths[target] for target in self._imports[file_id]],
+            [self.paths[source] for source in self._imported_by[file_id]],
+            self._external[file_id]
+        )
+
+
+class ReferenceIndex:
+    """Symbol table, reference postings and import lists of one repository
+
+    Every reference is a row of typed arrays (file, line, kind) and each name
+    maps to the rows that mention it and to the elements that define it, so
+    looking up a symbol costs O(results) however large the repository is. The
+    import graph is resolved from the per-file import lists on first use and
+    kept until more files are added.
+    """
+
+    def __init__(self):
+        # Parsing adds files from a worker thread while requests read
+        self._lock = threading.Lock()
+        self.file_paths = []
+        self._file_ids = {}
+        # file id -> [[module specifier, line]] as the parser recorded them
+        self._imports = []
+        # file id -> (first, last + 1) reference row of the file
+        self._ranges = []
+        self._files = array('I')
+        self._lines = array('I')
+        self._kinds = array('B')
+        # name -> reference rows, and name -> ids of the elements defining it
+        self._usages = {}
+        self._definitions = {}
+        self._element_count = 0
+        self._graph = None
+
+    def __len__(self):
+        return len(self._lines)
+
+    def add_file(self, file_path: str, references: dict):
+        """Record one parsed file's imports and references, as the parsers emit them"""
+        with self._lock:
+            file_id = self._file_ids[file_path] = len(self.file_paths)
+            self.file_paths.append(sys.intern(file_path))
+            self._imports.append(references['imports'])
+            first = len(self._lines)
+            for name, line, kind in references['references']:
+                postings = self._usages.get(name)
+                if postings is None:
+                    postings = self._usages[sys.intern(name)] = array('I')
+                postings.append(len(self._lines))
+                self._files.append(file_id)
+                self._lines.append(line)
+                self._kinds.append(_KIND_IDS[kind])
+            self._ranges.append((first, len(self._lines)))
+            self._graph = None
+
+    def add_definitions(self, elements):
+        """Index element dicts that were just appended to the store, in the same order"""
+        with self._lock:
+            for element in elements:
+                definitions = self._definitions.get(element['name'])
+                if definitions is None:
+                    definitions = self._definitions[sys.intern(element['name'])] = array('I')
+                definitions.append(self._element_count)
+                self._element_count += 1
+
+    def definitions(self, name: str):
+        """Ids of the elements named name"""
+        with self._lock:
+            return self._definitions.get(name, array('I')).tolist()
+
+    def usages(self, name: str, offset: int = 0, limit: int = 100):
+        """(total, page of {file_path, line, kind}) of the references to name, in walk order"""
+        with self._lock:
+            postings = self._usages.get(name, ())
+            page = postings[offset:offset + limit]
+            return len(postings), [
+                {"file_path": self.file_paths[self._files[row]], "line": self._lines[row], "kind": KINDS[self._kinds[row]]}
+                for row in page
+            ]
+
+    def graph(self):
+        """The import graph, resolved now if files were added since it was last built"""
+        with self._lock:
+            if self._graph is None:
+                self._graph = self._build_graph()
+            return self._graph
+
+    def iter_files(self):
+        """(file_path, references) per file in the form add_file takes, for persisting"""
+        with self._lock:
+            names = [None] * len(self._lines)
+            for name, postings in self._usages.items():
+                for row in postings:
+                    names[row] = name
+            files = [
+                (file_path, self._imports[file_id], range(*self._ranges[file_id]))
+                for file_id, file_path in enumerate(self.file_paths)
+            ]
+        for file_path, imports, rows in files:
+            yield file_path, {
+                'imports': imports,
+                'references': [[names[row], self._lines[row], KINDS[self._kinds[row]]] for row in rows]
+            }
+
+    def memory_usage(self):
+        """Approximate bytes held by the reference rows, postings and import lists"""
+        with self._lock:
+            total = sum(sys.getsizeof(column) for column in (self._files, self._lines, self._kinds))
+            total += sys.getsizeof(self._usages) + sum(sys.getsizeof(postings) for postings in self._usages.values())
+            total += sys.getsizeof(self._definitions) + sum(sys.getsizeof(ids) for ids in self._definitions.values())
+            # Each import is a two-item list holding a short string and an int
+            total += sum(sys.getsizeof(imports) + 150 * len(imports) for imports in self._imports)
+            return total
+
+    def _build_graph(self):
+        paths = list(self.file_paths)
+        # Dotted module path of every Python file, under each of its suffixes,
+        # so imports resolve whichever directory is on sys.path
+        modules = {}
+        packages = {}
+        for file_id, path in enumerate(paths):
+            if not path.endswith('.py'):
+                continue
+            parts = path[:-len('.py')].split('/')
+            if parts[-1] == '__init__':
+                parts.pop()
+            packages['/'.join(parts)] = file_id
+            for start in range(len(parts)):
+                modules.setdefault('.'.join(parts[start:]), []).append(file_id)
+
+        imports = [array('I') for _ in paths]
+        imported_by = [array('I') for _ in paths]
+        external = []
+        for file_id, path in enumerate(paths):
+            is_python = path.endswith('.py')
+            targets = set()
+            outside = set()
+            for specifier, _ in self._imports[file_id]:
+                if is_python:
+                    target = self._resolve_python(path, specifier, modules, packages)
+                else:
+                    target = self._resolve_js(path, specifier)
+                if target is None:
+                    outside.add(_external_name(specifier, is_python))
+                elif target != file_id:
+                    targets.add(target)
+            for target in sorted(targets):
+                imports[file_id].append(target)
+                imported_by[target].append(file_id)
+            external.append(sorted(outside))
+        return ImportGraph(paths, imports, imported_by, external)
+
+    def _resolve_python(self, path: str, specifier: str, modules, packages):
+        """File id of the module specifier names, dropping trailing names that are not modules"""
+        names = specifier.lstrip('.')
+        level = len(specifier) - len(names)
+        names = names.split('.') if names else []
+        if level:
+            package = path.split('/')[:-1]
+            if level - 1 > len(package):
+                return None
+            package = package[:len(package) - (level - 1)]
+            while True:
+                target = packages.get('/'.join(package + names))
+                if target is not None or not names:
+                    return target
+                names.pop()
+
+        importer = path.split('/')
+        while names:
+            candidates = modules.get('.'.join(names))
+            if candidates:
+                # The same name in several places: prefer the one nearest the importer
+                return max(candidates, key=lambda candidate: len(os.path.commonprefix([importer, self.file_paths[candidate].split('/')])))
+            names.pop()
+        return None
+
+    def _resolve_js(self, path: str, specifier: str):
+        """File id of a relative import, trying the usual extensions and index files"""
+        if not specifier.startswith(('./', '../')) and specifier not in ('.', '..'):
+            return None
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), specifier))
+        candidates = [base]
+        candidates.extend(base + extension for extension in _JS_EXTENSIONS)
+        candidates.extend(f"{base}/index{extension}" for extension in _JS_EXTENSIONS)
+        for candidate in candidates:
+            target = self._file_ids.get(candidate)
+            if target is not None:
+                return target
+        return None
+
+
+def _external_name(specifier: str, is_python: bool):
+    """Package a specifier comes from: `os.path` -> os, `@scope/pkg/sub` -> @scope/pkg
+
+    Relative specifiers that match no parsed file are kept as written.
+    """
+    if specifier.startswith('.'):
+        return specifier
+    if is_python:
+        return specifier.split('.')[0]
+    if specifier.startswith('@'):
+        return '/'.join(specifier.split('/')[:2])
+    return specifier.split('/')[0]
@@ -1,55 +1,164 @@
-import git
+import hashlib
+import logging
 import os
+import re
 import shutil
 from pathlib import Path
 import tempfile
+from services.file_walker import walk_repository
+
+logger = logging.getLogger(__name__)
+
+def _git():
+    """GitPython, imported on the first clone rather than when the server starts"""
+    import git
+    return git
 
 class RepositoryService:
-    def __init__(self):
-        self.repos_dir = Path("./repos")
-        self.repos_dir.mkdir(exist_ok=True)
+    def __init__(self, depth: int = 1, blob_filter: str = None, repos_dir: str = "./repos"):
+        # Created by the first clone, so constructing the service touches nothing
+        self.repos_dir = Path(repos_dir)
+        # Shallow, single-branch clones by default; depth=0 clones full history
+        self.depth = depth
+        self.blob_filter = blob_filter
+    
+    @staticmethod
+    def normalize_url(github_url: str):
+        """Canonical form of a repository URL, so equivalent spellings share a checkout"""
+        url = github_url.strip().rstrip('/')
+        
+        # git@host:owner/repo -> host/owner/repo
+        ssh_match = re.match(r'^[\w.-]+@([\w.-]+):(.+)$', url)
+        if ssh_match:
+            return f"{ssh_match.group(1).lower()}/{ssh_match.group(2).removesuffix('.git')}"
+        
+        scheme_match = re.match(r'^(?:https?|ssh|git)://(?:[^@/]+@)?([^/]+)/(.+)$', url)
+        if scheme_match:
+            return f"{scheme_match.group(1).lower()}/{scheme_match.group(2).removesuffix('.git')}"
+        
+        # Local paths and file:// URLs (bare repos used as remotes)
+        if url.startswith('file://'):
+            url = url[len('file://'):]
+        return str(Path(url).expanduser().resolve())
     
-    def clone_repository(self, github_url: str, repo_id: str):
-        """Clone a GitHub repository locally"""
+    def repository_key(self, github_url: str, ref: str = None):
+        """Identity of a repository at a branch or tag: its normalized URL, plus #ref when one is given"""
+        normalized = self.normalize_url(github_url)
+        return f"{normalized}#{ref}" if ref else normalized
+    
+    def checkout_path(self, github_url: str, ref: str = None):
+        """Checkout directory for a URL and ref, named after their normalized form"""
+        normalized = self.repository_key(github_url, ref)
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', normalized).strip('_')[-80:]
+        digest = hashlib.sha1(normalized.encode()).hexdigest()[:10]
+        return self.repos_dir / f"{slug}-{digest}"
+    
+    def clone_repository(self, github_url: str, ref: str = None):
+        """Clone a repository at a branch or tag (default: its default branch), or fetch and fast-forward an existing checkout of it"""
+        repo_path = self.checkout_path(github_url, ref)
+        
+        if (repo_path / '.git').exists():
+            try:
+                return self._update_checkout(github_url, repo_path, ref)
+            except Exception as e:
+                # Broken or diverged checkout; start over with a fresh clone
+                logger.warning("Updating %s failed (%s), re-cloning", repo_path, e)
+        
         try:
-            repo_path = self.repos_dir / repo_id
-            
-            # Remove if exists
             if repo_path.exists():
                 shutil.rmtree(repo_path)
+            self.repos_dir.mkdir(parents=True, exist_ok=True)
             
-            # Clone repository
-            print(f"Cloning {github_url} to {repo_path}")
-            git.Repo.clone_from(github_url, repo_path)
+            logger.info("Cloning %s%s to %s", github_url, f" at {ref}" if ref else "", repo_path)
+            options = self._fetch_options()
+            if ref:
+                options['branch'] = ref
+            repo = _git().Repo.clone_from(self._remote_url(github_url), repo_path, **options)
             
-            return str(repo_path)
+            return {
+                "repo_path": str(repo_path),
+                "head": repo.head.commit.hexsha,
+                "updated": True,
+                "changed_files": None  # Fresh clone: everything is new
+            }
         except Exception as e:
             raise Exception(f"Failed to clone repository: {str(e)}")
     
-    def get_file_structure(self, repo_path: str):
+    def _update_checkout(self, github_url: str, repo_path: Path, ref: str = None):
+        """Fetch the requested ref, or the checked-out branch, and move the working tree to it"""
+        repo = _git().Repo(repo_path)
+        old_head = repo.head.commit.hexsha
+        branch = ref or repo.active_branch.name
+        
+        logger.info("Fetching %s (%s) into %s", github_url, branch, repo_path)
+        fetch_args = ['origin', branch]
+        fetch_args += [f"--{key.replace('_', '-')}={value}" for key, value in self._fetch_options().items()
+                       if key != 'single_branch']
+        repo.git.fetch(*fetch_args)
+        new_head = repo.commit('FETCH_HEAD').hexsha
+        
+        if new_head == old_head:
+            return {"repo_path": str(repo_path), "head": new_head, "updated": False, "changed_files": []}
+        
+        # A shallow checkout lacks the history merge --ff-only needs; the fetched
+        # commit is the remote tip, so moving the branch to it is the fast-forward
+        repo.git.reset('--hard', new_head)
+        changed_files = repo.git.diff('--name-only', '--no-renames', old_head, new_head).splitlines()
+        
+        return {
+            "repo_path": str(repo_path),
+            "head": new_head,
+            "updated": True,
+            "changed_files": changed_files
+        }
+    
+    def restore_checkout(self, repo_path: str, head: str):
+        """Move a checkout back to head if it is elsewhere, e.g. after a failed re-parse of a newer commit
+
+        Returns whether the working tree changed.
+        """
+        repo = _git().Repo(repo_path)
+        if repo.head.commit.hexsha == head:
+            return False
+        logger.info("Restoring %s to %s", repo_path, head)
+        repo.git.reset('--hard', head)
+        return True
+    
+    def _fetch_options(self):
+        options = {}
+        if self.depth:
+            options['depth'] = self.depth
+            options['single_branch'] = True
+        if self.blob_filter:
+            options['filter'] = self.blob_filter
+        return options
+    
+    def _remote_url(self, github_url: str):
+        """URL to clone from; local paths become file:// so --depth is honoured"""
+        normalized = self.normalize_url(github_url)
+        if os.path.isabs(normalized):
+            return Path(normalized).as_uri()
+        return github_url
+    
+    def walk_repository(self, repo_path: str, progress=None):
+        """Walk a checkout once, returning the records both listing and parsing use"""
+        records = []
+        for record in walk_repository(repo_path):
+            records.append(record)
+            if progress is not None:
+                progress["files_walked"] = len(records)
+        return records
+    
+    def get_file_structure(self, repo_path: str, records=None):
         """Get basic file structure"""
-        repo_path = Path(repo_path)
-        files = []
-        
-        for file_path in repo_path.rglob("*"):
-            if file_path.is_file() and not self._should_ignore(file_path):
-                relative_path = file_path.relative_to(repo_path)
-                files.append({
-                    "path": str(relative_path),
-                    "size": file_path.stat().st_size,
-                    "extension": file_path.suffix
-                })
-        
-        return files
-    
-    def _should_ignore(self, file_path: Path):
-        """Skip common non-code files"""
-        ignore_patterns = ['.git', '__pycache__', 'node_modules', '.env']
-        ignore_extensions = ['.pyc', '.log', '.tmp']
-        
-        path_str = str(file_path)
-        return (
-            any(pattern in path_str for pattern in ignore_patterns) or
-            any(path_str.endswith(ext) for ext in ignore_extensions) or
-            file_path.stat().st_size > 1024 * 1024  # Skip files > 1MB
-        )
\ No newline at end of file
+        if records is None:
+            records = walk_repository(repo_path)
+        
+        return [
+            {
+                "path": record.relative_path,
+                "size": record.size,
+                "extension": record.extension
+            }
+            for record in records
+        ]
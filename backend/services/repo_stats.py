@@ -0,0 +1,142 @@
+import heapq
+import os
+import threading
+from collections import Counter
+from itertools import islice
+
+from parsers.code_parser import EXTENSION_LANGUAGES
+from services.file_classifier import SOURCE
+
+# Entries kept in each ranked list of the summary
+TOP_N = 20
+
+
+def _directory(relative_path: str):
+    return os.path.dirname(relative_path).replace(os.sep, '/') or '.'
+
+
+def _top_level(relative_path: str):
+    parts = relative_path.replace(os.sep, '/').split('/', 1)
+    return parts[0] if len(parts) > 1 else '.'
+
+
+class RepositoryStats:
+    """Repository summary accumulated while files are walked and parsed
+
+    Counters are updated once per file, so the summary is ready when parsing
+    ends and is stored with the repository metadata instead of recomputed.
+    """
+
+    def __init__(self):
+        # Parsing adds files from a worker thread while requests read the summary
+        self._lock = threading.Lock()
+        # relative path -> row of the paginated file listing, in walk order
+        self.files = {}
+        self.total_bytes = 0
+        self.parsed_files = 0
+        self.lines = 0
+        self.element_types = Counter()
+        self.element_languages = Counter()
+        # Files per file_classifier category
+        self.categories = Counter()
+        # name -> Counter of files, bytes, lines and elements
+        self.languages = {}
+        self.directories = {}
+        self.top_level = {}
+
+    def add_files(self, records):
+        """Count walked files; parsed ones are completed by add_parsed"""
+        with self._lock:
+            for record in records:
+                language = EXTENSION_LANGUAGES.get(record.extension)
+                self.files[record.relative_path] = {
+                    "path": record.relative_path,
+                    "size": record.size,
+                    "extension": record.extension,
+                    "language": language,
+                    "category": record.category,
+                    "lines": None,
+                    "elements": None,
+                }
+                self.categories[record.category] += 1
+                self.total_bytes += record.size
+                counts = {"files": 1, "bytes": record.size}
+                self._bump(self.directories, _directory(record.relative_path), counts)
+                self._bump(self.top_level, _top_level(record.relative_path), counts)
+                if language is not None:
+                    self._bump(self.languages, language, counts)
+
+    def add_parsed(self, parsed_file):
+        """Fold one parsed file's line count and elements into the summary
+
+        Files the parser found to be binary, generated or minified only change category.
+        """
+        record = parsed_file.record
+        elements = parsed_file.elements
+        counts = {"lines": parsed_file.line_count, "elements": len(elements)}
+        with self._lock:
+            row = self.files.get(record.relative_path)
+            if parsed_file.category != SOURCE:
+                if row is not None:
+                    self.categories[row["category"]] -= 1
+                    row["category"] = parsed_file.category
+                    self.categories[parsed_file.category] += 1
+                return
+            if row is not None:
+                row.update(counts)
+
+            self.parsed_files += 1
+            self.lines += parsed_file.line_count
+            for element in elements:
+                self.element_types[element['type']] += 1
+                self.element_languages[element['language']] += 1
+
+            self._bump(self.directories, _directory(record.relative_path), counts)
+            self._bump(self.top_level, _top_level(record.relative_path), counts)
+            language = EXTENSION_LANGUAGES.get(record.extension)
+            if language is not None:
+                self._bump(self.languages, language, counts)
+
+    def summary(self):
+        """JSON-ready totals, per-language/type/directory counts and ranked lists"""
+        with self._lock:
+            return {
+                "file_count": len(self.files),
+                "total_bytes": self.total_bytes,
+                "parsed_files": self.parsed_files,
+                "lines_of_code": self.lines,
+                "element_count": sum(self.element_types.values()),
+                "elements_by_type": dict(self.element_types),
+                "elements_by_language": dict(self.element_languages),
+                "files_by_category": {category: count for category, count in self.categories.items() if count},
+                "languages": self._ranked(self.languages, "lines", len(self.languages)),
+                "directory_count": len(self.directories),
+                "directories": self._ranked(self.directories, "elements", TOP_N),
+                "top_packages": self._ranked(self.top_level, "elements", TOP_N),
+                "largest_files": [
+                    dict(row) for row in heapq.nlargest(TOP_N, self.files.values(), key=lambda row: row["size"])
+                ],
+            }
+
+    def page(self, offset: int, limit: int):
+        """Rows of the file listing, in walk order"""
+        with self._lock:
+            return [dict(row) for row in islice(self.files.values(), offset, offset + limit)]
+
+    def file_rows(self):
+        """Every row of the file listing, for persisting"""
+        with self._lock:
+            return [dict(row) for row in self.files.values()]
+
+    def _bump(self, table, key, counts):
+        counter = table.get(key)
+        if counter is None:
+            counter = table[key] = Counter()
+        counter.update(counts)
+
+    def _ranked(self, table, field, limit):
+        top = heapq.nlargest(limit, table.items(), key=lambda item: (item[1][field], item[1]["files"]))
+        return [
+            {"name": name, "files": counts["files"], "bytes": counts["bytes"], "lines": counts["lines"], "elements": counts["elements"]}
+            for name, counts in top
+        ]
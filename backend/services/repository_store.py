@@ -0,0 +1,477 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import groupby
+from pathlib import Path
+from typing import NamedTuple
+
+from services.element_store import ElementStore
+from services.reference_index import ReferenceIndex
+from services.retrieval_index import RetrievalIndex
+from services.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Elements materialized per batch while rebuilding a search index
+_INDEX_BATCH = 10000
+
+# SQLite caps the number of bound parameters per statement
+_DELETE_BATCH = 500
+
+# Tables mapping a repository's files to parsed_content rows
+_SHARED_TABLES = ('element_files', 'reference_files')
+
+
+class ParsedRepository(NamedTuple):
+    """A repository's parsed elements and the indexes built over them"""
+    elements: ElementStore
+    search_index: SearchIndex
+    retrieval_index: RetrievalIndex
+    references: ReferenceIndex
+
+    @classmethod
+    def create(cls, elements: ElementStore, references: ReferenceIndex = None):
+        return cls(elements, SearchIndex(elements), RetrievalIndex(), references or ReferenceIndex())
+
+    def add(self, elements):
+        """Append freshly parsed element dicts and index them
+
+        Parsers no longer copy snippets into elements, so the indexes are fed
+        the stored elements with their code read back from the source file.
+        """
+        first = len(self.elements)
+        self.elements.extend(elements)
+        self.index(self.elements[first:])
+
+    def index(self, elements):
+        """Index element dicts that were just appended to the store, snippets included"""
+        self.search_index.add(elements)
+        self.retrieval_index.add(elements)
+        self.references.add_definitions(elements)
+
+    def memory_usage(self):
+        return (self.elements.memory_usage() + self.search_index.memory_usage()
+                + self.retrieval_index.memory_usage() + self.references.memory_usage())
+
+
+class RepositoryStore(ABC):
+    """Persistence backend for repository metadata and parsed elements"""
+
+    @abstractmethod
+    def save_repository(self, repo_id: str, info: dict):
+        ...
+
+    @abstractmethod
+    def load_repository(self, repo_id: str):
+        """Stored metadata for repo_id, or None"""
+
+    @abstractmethod
+    def find_repository(self, normalized_url: str):
+        """repo_id already registered for a normalized URL, or None"""
+
+    @abstractmethod
+    def list_repositories(self):
+        ...
+
+    @abstractmethod
+    def count_repositories(self):
+        ...
+
+    @abstractmethod
+    def save_elements(self, repo_id: str, elements: ElementStore, head: str = None):
+        """Replace the elements of repo_id, recording the commit their snippet spans point into"""
+
+    @abstractmethod
+    def load_elements(self, repo_id: str, repo_path: str):
+        """ElementStore for repo_id, or None if it was never parsed"""
+
+    @abstractmethod
+    def load_head(self, repo_id: str):
+        """Commit the stored elements of repo_id were parsed from, or None if unknown"""
+
+    @abstractmethod
+    def save_files(self, repo_id: str, rows):
+        """Replace the per-file listing of repo_id with rows, in order"""
+
+    @abstractmethod
+    def load_files(self, repo_id: str, offset: int, limit: int):
+        """Page of the per-file listing of repo_id"""
+
+    @abstractmethod
+    def save_references(self, repo_id: str, references: ReferenceIndex):
+        ...
+
+    @abstractmethod
+    def load_references(self, repo_id: str):
+        """ReferenceIndex for repo_id, or None if it was parsed without one"""
+
+    @abstractmethod
+    def save_batch(self, batch_id: str, repo_ids):
+        """Record the repo_ids submitted together as batch_id"""
+
+    @abstractmethod
+    def load_batch(self, batch_id: str):
+        """repo_ids of batch_id in submission order, or None if it is unknown"""
+
+    @abstractmethod
+    def content_stats(self):
+        ...
+
+
+class SQLiteRepositoryStore(RepositoryStore):
+    """RepositoryStore backed by a local SQLite database"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS repositories ("
+                " repo_id TEXT PRIMARY KEY,"
+                " normalized_url TEXT,"
+                " info TEXT NOT NULL"
+                ")"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS repositories_url ON repositories (normalized_url)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS elements ("
+                " repo_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " data TEXT NOT NULL,"
+                " PRIMARY KEY (repo_id, seq)"
+                ") WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " repo_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " data TEXT NOT NULL,"
+                " PRIMARY KEY (repo_id, seq)"
+                ") WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_references ("
+                " repo_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " file_path TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " PRIMARY KEY (repo_id, seq)"
+                ") WITHOUT ROWID"
+            )
+            # Per-file parse results keyed by a hash of their JSON, so the same
+            # file in several repositories (forks, mirrors, release branches)
+            # is stored once; elements and file_references above are the
+            # per-repository layout older databases still hold
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parsed_content ("
+                " content_sha TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            # Commit each repository's stored snippet spans were taken from,
+            # written in the same transaction as its elements
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS element_heads ("
+                " repo_id TEXT PRIMARY KEY,"
+                " head TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " batch_id TEXT PRIMARY KEY,"
+                " repo_ids TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            for table in _SHARED_TABLES:
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    " repo_id TEXT NOT NULL,"
+                    " seq INTEGER NOT NULL,"
+                    " file_path TEXT NOT NULL,"
+                    " content_sha TEXT NOT NULL,"
+                    " PRIMARY KEY (repo_id, seq)"
+                    ") WITHOUT ROWID"
+                )
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_content ON {table} (content_sha)")
+
+    def save_repository(self, repo_id: str, info: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO repositories (repo_id, normalized_url, info) VALUES (?, ?, ?)",
+                (repo_id, info.get("normalized_url"), json.dumps(info))
+            )
+
+    def load_repository(self, repo_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info FROM repositories WHERE repo_id = ?", (repo_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_repository(self, normalized_url: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT repo_id FROM repositories WHERE normalized_url = ?", (normalized_url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def list_repositories(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT repo_id FROM repositories ORDER BY rowid")]
+
+    def count_repositories(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM repositories").fetchone()[0]
+
+    def save_elements(self, repo_id: str, elements: ElementStore, head: str = None):
+        # Elements arrive file by file; each file's path-free list is one shared row
+        files = (
+            (file_path, [{k: v for k, v in element.items() if k != 'file_path'} for element in group])
+            for file_path, group in groupby(elements.iter_records(), key=lambda element: element['file_path'])
+        )
+        self._save_shared('element_files', 'elements', repo_id, files, head)
+
+    def load_elements(self, repo_id: str, repo_path: str):
+        files = self._load_shared('element_files', repo_id)
+        if files is not None:
+            records = (dict(element, file_path=file_path) for file_path, data in files for element in data)
+        else:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT data FROM elements WHERE repo_id = ? ORDER BY seq", (repo_id,)
+                ).fetchall()
+            if not rows:
+                return None
+            records = (json.loads(data) for (data,) in rows)
+
+        elements = ElementStore(repo_path)
+        elements.extend(records)
+        return elements
+
+    def load_head(self, repo_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT head FROM element_heads WHERE repo_id = ?", (repo_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_files(self, repo_id: str, rows):
+        rows = ((repo_id, seq, json.dumps(row)) for seq, row in enumerate(rows))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE repo_id = ?", (repo_id,))
+            self._conn.executemany("INSERT INTO files (repo_id, seq, data) VALUES (?, ?, ?)", rows)
+
+    def load_files(self, repo_id: str, offset: int, limit: int):
+        # Rows are numbered densely, so a page is a primary key range scan
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM files WHERE repo_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (repo_id, offset, offset + limit)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def save_references(self, repo_id: str, references: ReferenceIndex):
+        self._save_shared('reference_files', 'file_references', repo_id, references.iter_files())
+
+    def load_references(self, repo_id: str):
+        files = self._load_shared('reference_files', repo_id)
+        if files is None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT file_path, data FROM file_references WHERE repo_id = ? ORDER BY seq", (repo_id,)
+                ).fetchall()
+            if not rows:
+                return None
+            files = ((file_path, json.loads(data)) for file_path, data in rows)
+
+        references = ReferenceIndex()
+        for file_path, data in files:
+            references.add_file(file_path, data)
+        return references
+
+    def save_batch(self, batch_id: str, repo_ids):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches (batch_id, repo_ids) VALUES (?, ?)", (batch_id, json.dumps(list(repo_ids)))
+            )
+
+    def load_batch(self, batch_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT repo_ids FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def content_stats(self):
+        """Files listed by stored repositories, and the distinct parse results behind them"""
+        with self._lock:
+            stats = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in _SHARED_TABLES
+            }
+            stats["parsed_content"] = self._conn.execute("SELECT COUNT(*) FROM parsed_content").fetchone()[0]
+        return stats
+
+    def _save_shared(self, table: str, legacy_table: str, repo_id: str, files, head: str = None):
+        """Replace repo_id's rows in table with (file_path, data) pairs, storing each distinct data once
+
+        A head is recorded as the commit the rows were parsed from, atomically with them.
+        """
+        rows = []
+        contents = {}
+        for seq, (file_path, data) in enumerate(files):
+            text = json.dumps(data, separators=(',', ':'))
+            content_sha = hashlib.sha1(text.encode()).hexdigest()
+            contents[content_sha] = text
+            rows.append((repo_id, seq, file_path, content_sha))
+
+        with self._lock, self._conn:
+            previous = {
+                content_sha for (content_sha,)
+                in self._conn.execute(f"SELECT content_sha FROM {table} WHERE repo_id = ?", (repo_id,))
+            }
+            self._conn.execute(f"DELETE FROM {table} WHERE repo_id = ?", (repo_id,))
+            self._conn.execute(f"DELETE FROM {legacy_table} WHERE repo_id = ?", (repo_id,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO parsed_content (content_sha, data) VALUES (?, ?)", contents.items()
+            )
+            self._conn.executemany(
+                f"INSERT INTO {table} (repo_id, seq, file_path, content_sha) VALUES (?, ?, ?, ?)", rows
+            )
+            self._delete_unreferenced(previous - contents.keys())
+            if head is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO element_heads (repo_id, head) VALUES (?, ?)", (repo_id, head)
+                )
+
+    def _load_shared(self, table: str, repo_id: str):
+        """(file_path, data) pairs of repo_id in order, or None if it has no rows in table"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT t.file_path, t.content_sha, c.data FROM {table} t"
+                " JOIN parsed_content c ON c.content_sha = t.content_sha"
+                " WHERE t.repo_id = ? ORDER BY t.seq",
+                (repo_id,)
+            ).fetchall()
+        if not rows:
+            return None
+        # Identical files decode once; callers copy rather than mutate the data
+        decoded = {}
+        files = []
+        for file_path, content_sha, text in rows:
+            data = decoded.get(content_sha)
+            if data is None:
+                data = decoded[content_sha] = json.loads(text)
+            files.append((file_path, data))
+        return files
+
+    def _delete_unreferenced(self, content_shas):
+        """Drop the parsed_content rows among content_shas that no repository refers to any more"""
+        content_shas = list(content_shas)
+        unreferenced = " AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.content_sha = parsed_content.content_sha)"
+            for table in _SHARED_TABLES
+        )
+        for start in range(0, len(content_shas), _DELETE_BATCH):
+            batch = content_shas[start:start + _DELETE_BATCH]
+            self._conn.execute(
+                f"DELETE FROM parsed_content WHERE content_sha IN ({','.join('?' * len(batch))}) AND {unreferenced}",
+                batch
+            )
+
+
+class LoadedRepositories:
+    """Parsed repositories held in memory, loaded on first access and evicted LRU over a memory budget"""
+
+    def __init__(self, store: RepositoryStore, memory_budget: int):
+        self.store = store
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        # repo_id -> (ParsedRepository, approximate bytes), least recently used first
+        self._entries = OrderedDict()
+        # Repositories still being parsed; never evicted and not counted yet
+        self._pinned = set()
+
+    def __contains__(self, repo_id: str):
+        with self._lock:
+            return repo_id in self._entries
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def peek(self, repo_id: str):
+        """ParsedRepository if already in memory, else None"""
+        with self._lock:
+            entry = self._entries.get(repo_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(repo_id)
+            return entry[0]
+
+    def get(self, repo_id: str, repo_path: str):
+        """ParsedRepository for repo_id, loading from the store on a miss"""
+        loaded = self.peek(repo_id)
+        if loaded is not None:
+            return loaded
+
+        # Load outside the lock so other repositories stay available meanwhile
+        elements = self.store.load_elements(repo_id, repo_path)
+        if elements is None:
+            return None
+        parsed = ParsedRepository.create(elements, self.store.load_references(repo_id))
+        for start in range(0, len(elements), _INDEX_BATCH):
+            parsed.index(elements[start:start + _INDEX_BATCH])
+
+        with self._lock:
+            if repo_id not in self._entries:
+                self._entries[repo_id] = (parsed, parsed.memory_usage())
+                self._evict()
+            entry = self._entries[repo_id]
+        return entry[0]
+
+    def start(self, repo_id: str, parsed: ParsedRepository):
+        """Publish a repository that is still being parsed"""
+        with self._lock:
+            self._pinned.add(repo_id)
+            self._entries[repo_id] = (parsed, 0)
+            self._entries.move_to_end(repo_id)
+
+    def finish(self, repo_id: str):
+        """Mark a repository fully parsed so it counts toward the budget"""
+        with self._lock:
+            self._pinned.discard(repo_id)
+            entry = self._entries.get(repo_id)
+            if entry is not None:
+                self._entries[repo_id] = (entry[0], entry[0].memory_usage())
+            self._evict()
+
+    def discard(self, repo_id: str):
+        """Forget a repository, such as a parse that failed, so its last stored state loads next"""
+        with self._lock:
+            self._pinned.discard(repo_id)
+            self._entries.pop(repo_id, None)
+
+    def memory_usage(self):
+        with self._lock:
+            return sum(entry[1] for entry in self._entries.values())
+
+    def element_count(self):
+        """Elements held by the loaded repositories, including ones still parsing"""
+        with self._lock:
+            return sum(len(entry[0].elements) for entry in self._entries.values())
+
+    def _evict(self):
+        """Drop least recently used repositories until under budget; they reload from the store"""
+        total = sum(entry[1] for entry in self._entries.values())
+        for repo_id in list(self._entries):
+            if total <= self.memory_budget or len(self._entries) <= 1:
+                break
+            if repo_id in self._pinned:
+                continue
+            total -= self._entries.pop(repo_id)[1]
+            logger.info("Evicted %s from memory", repo_id)
@@ -0,0 +1,133 @@
+import math
+import re
+import sys
+import threading
+from array import array
+
+# Words, split at camelCase and snake_case boundaries
+_WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+
+# Tokens are hashed into this many buckets so the vocabulary stays bounded
+HASH_BUCKETS = 1 << 20
+
+# Field weights: a term in the name says more than one deep in the body
+NAME_WEIGHT = 3
+DOCSTRING_WEIGHT = 2
+# Only the head of each snippet is indexed; it carries the signature and intent
+CODE_CHARS = 2000
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'def', 'do', 'does', 'for', 'from',
+    'function', 'how', 'if', 'in', 'is', 'it', 'of', 'on', 'or', 'return', 'self', 'the', 'this',
+    'to', 'what', 'where', 'which', 'with', 'none', 'true', 'false', 'const', 'let', 'var',
+}
+
+
+def tokenize(text: str):
+    """Lowercased word tokens with identifiers split into their parts"""
+    tokens = []
+    for word in _WORD.findall(text):
+        word = word.lower()
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        # Crude plural folding so `requests` finds `request`
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _bucket(token: str):
+    return hash(token) & (HASH_BUCKETS - 1)
+
+
+class RetrievalIndex:
+    """Hashed bag-of-words vectors of every element, ranked with BM25 for /ask
+
+    Each element's term vector is stored column-wise: one posting list of
+    (element id, term frequency) per hash bucket, which is what a top-k query
+    over a handful of question terms needs to read.
+    """
+
+    def __init__(self):
+        # Parsing adds elements from a worker thread while questions are answered
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._frequencies = {}
+        self._lengths = array('f')
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def memory_usage(self):
+        """Approximate bytes held by the posting lists and lengths"""
+        with self._lock:
+            total = sys.getsizeof(self._ids) + sys.getsizeof(self._frequencies) + sys.getsizeof(self._lengths)
+            total += sum(sys.getsizeof(posting) for posting in self._ids.values())
+            total += sum(sys.getsizeof(posting) for posting in self._frequencies.values())
+            return total
+
+    def add(self, elements):
+        """Vectorize element dicts that were just appended to the store, in the same order"""
+        with self._lock:
+            for element in elements:
+                element_id = len(self._lengths)
+                counts = {}
+                terms = (
+                    tokenize(element['name']) * NAME_WEIGHT +
+                    tokenize(element.get('docstring') or '') * DOCSTRING_WEIGHT +
+                    tokenize(element['file_path']) +
+                    tokenize((element.get('code') or '')[:CODE_CHARS])
+                )
+                for term in terms:
+                    bucket = _bucket(term)
+                    counts[bucket] = counts.get(bucket, 0) + 1
+
+                for bucket, count in counts.items():
+                    ids = self._ids.get(bucket)
+                    if ids is None:
+                        ids = self._ids[bucket] = array('I')
+                        self._frequencies[bucket] = array('H')
+                    ids.append(element_id)
+                    self._frequencies[bucket].append(min(count, 65535))
+
+                self._lengths.append(len(terms))
+                self._total_length += len(terms)
+
+    def search(self, query: str, k: int = 6):
+        """Return [(element id, score)] of the k elements most relevant to query"""
+        # Imported on the first search so server startup does not pay for numpy
+        import numpy as np
+
+        buckets = {}
+        for term in tokenize(query):
+            bucket = _bucket(term)
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+
+        with self._lock:
+            count = len(self._lengths)
+            if not buckets or not count:
+                return []
+            # Copies, so appends never hit an array that is exporting its buffer
+            lengths = np.array(self._lengths, dtype=np.float32)
+            norm = K1 * (1 - B + B * lengths / (self._total_length / count))
+            scores = np.zeros(count, dtype=np.float32)
+
+            for bucket, query_count in buckets.items():
+                ids = self._ids.get(bucket)
+                if not ids:
+                    continue
+                ids = np.array(ids, dtype=np.intp)
+                frequencies = np.array(self._frequencies[bucket], dtype=np.float32)
+                idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+                scores[ids] += query_count * idf * frequencies * (K1 + 1) / (frequencies + norm[ids])
+
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(element_id), float(scores[element_id])) for element_id in top if scores[element_id] > 0]
@@ -0,0 +1,137 @@
+import sys
+import threading
+from array import array
+from collections import defaultdict
+
+# Rank tiers, lower is better
+RANK_NAME_EXACT = 0
+RANK_NAME_PREFIX = 1
+RANK_NAME = 2
+RANK_DOCSTRING = 3
+RANK_CODE = 4
+
+
+def _trigrams(text: str):
+    """Return the set of 3-character substrings of text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Trigram index over the elements of an ElementStore for substring search"""
+
+    def __init__(self, store):
+        # Parsing adds elements from a worker thread while requests search
+        self._lock = threading.Lock()
+        self.store = store
+        # Lowercased names and docstrings, computed once; code is read back
+        # from the store only for candidates that need it
+        self._names = []
+        self._docstrings = []
+        # trigram -> element ids, appended in increasing order
+        self._postings = defaultdict(lambda: array('I'))
+
+    def __len__(self):
+        return len(self._names)
+
+    def memory_usage(self):
+        """Approximate bytes held by the lowercased fields and postings"""
+        with self._lock:
+            total = sys.getsizeof(self._names) + sys.getsizeof(self._docstrings) + sys.getsizeof(self._postings)
+            total += sum(sys.getsizeof(value) for value in self._names)
+            total += sum(sys.getsizeof(value) for value in self._docstrings if value)
+            total += sum(sys.getsizeof(posting) for posting in self._postings.values())
+            return total
+
+    def add(self, elements):
+        """Index element dicts that were just appended to the store, in the same order"""
+        with self._lock:
+            for element in elements:
+                element_id = len(self._names)
+                name = element['name'].lower()
+                docstring = (element.get('docstring') or '').lower()
+
+                grams = _trigrams(name) | _trigrams(docstring) | _trigrams((element.get('code') or '').lower())
+                for gram in grams:
+                    self._postings[gram].append(element_id)
+
+                self._names.append(name)
+                self._docstrings.append(docstring)
+
+    def search(self, query: str, offset: int = 0, limit: int = 20, with_code: bool = False):
+        """Return (total, page) of elements matching query, best matches first
+
+        Page elements carry their snippet only when with_code is set. Reads
+        source files, so callers on an event loop run it in an executor.
+        """
+        if not query:
+            with self._lock:
+                indexed = len(self._names)
+            return indexed, self.store.get_many(range(offset, min(offset + limit, indexed)), with_code)
+        ranked = self.ranked(query)
+        page = ranked[offset:offset + limit]
+        return len(ranked), self.store.get_many((element_id for _, element_id in page), with_code)
+
+    def ranked(self, query: str):
+        """(rank tier, element id) of every element matching a non-empty query, best first
+
+        Lets callers merge the matches of several indexes before materializing
+        a page. Name and docstring matches are taken under the lock; code hits
+        are then confirmed against the source files without holding it, so
+        parsing can keep adding elements meanwhile.
+        """
+        query = query.lower()
+        with self._lock:
+            ranked, code_candidates = self._match(query)
+
+        # Trigrams only narrow the field; confirm code hits against the source
+        if code_candidates and len(query) >= 3:
+            for element_id, code in self.store.get_codes(code_candidates).items():
+                if query in code.lower():
+                    ranked.append((RANK_CODE, element_id))
+        ranked.sort()
+        return ranked
+
+    def _match(self, query: str):
+        """(name and docstring matches as (rank, id), ids of the other candidates) for a lowercased query"""
+        ranked = []
+        code_candidates = []
+        for element_id in self._candidates(query):
+            rank = self._rank(element_id, query)
+            if rank is not None:
+                ranked.append((rank, element_id))
+            else:
+                code_candidates.append(element_id)
+        return ranked, code_candidates
+
+    def _candidates(self, query: str):
+        """Element ids that may contain query, read from the rarest trigram postings"""
+        if len(query) < 3:
+            # Too short for trigrams; scan the lowercased names and docstrings
+            return range(len(self._names))
+
+        postings = []
+        for gram in _trigrams(query):
+            posting = self._postings.get(gram)
+            if not posting:
+                return ()
+            postings.append(posting)
+
+        # The rarest few trigrams narrow candidates enough; the rest is verified
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:3]:
+            candidates.intersection_update(posting)
+        return candidates
+
+    def _rank(self, element_id: int, query: str):
+        """Rank tier of a name or docstring match, or None if neither contains query"""
+        name = self._names[element_id]
+        if query in name:
+            if name == query:
+                return RANK_NAME_EXACT
+            if name.startswith(query):
+                return RANK_NAME_PREFIX
+            return RANK_NAME
+        if query in self._docstrings[element_id]:
+            return RANK_DOCSTRING
+        return None
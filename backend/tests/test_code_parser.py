@@ -0,0 +1,145 @@
+import threading
+
+from parsers.code_parser import CodeParser
+from parsers.parse_cache import ParseCache
+
+# Long enough to fail a wedged test run instead of hanging it
+JOIN_TIMEOUT = 30
+
+
+class RendezvousParser(CodeParser):
+    """Parser whose concurrent runs claim each batch in lockstep, so their claims always overlap"""
+
+    def __init__(self, parties: int, **kwargs):
+        super().__init__(**kwargs)
+        self.barrier = threading.Barrier(parties)
+
+    def _claim(self, records, blob_shas, pending):
+        claimed = super()._claim(records, blob_shas, pending)
+        self.barrier.wait(JOIN_TIMEOUT)
+        return claimed
+
+
+class ClaimCountingParser(CodeParser):
+    """Parser that counts the batches claimed, so a test can order runs against each other"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.claims = 0
+        self._claimed = threading.Condition()
+
+    def _claim(self, records, blob_shas, pending):
+        claimed = super()._claim(records, blob_shas, pending)
+        with self._claimed:
+            self.claims += 1
+            self._claimed.notify_all()
+        return claimed
+
+    def wait_for_claims(self, count: int):
+        with self._claimed:
+            assert self._claimed.wait_for(lambda: self.claims >= count, JOIN_TIMEOUT)
+
+
+def make_repository(root, name: str):
+    """Eight modules every repository shares, interleaved with four of its own"""
+    root.mkdir()
+    for number in range(8):
+        (root / f"shared_{number}.py").write_text(
+            f'class Shared{number}:\n    """Shared module {number}"""\n\n    def method(self):\n        return {number}\n'
+        )
+        if number % 2:
+            (root / f"shared_{number}_{name}.py").write_text(f"def {name}_{number}():\n    return '{name}'\n")
+    return str(root)
+
+
+def parse_concurrently(parser, repo_paths):
+    """Parse each repository on a thread of its own; (parsed files, stats) per repository"""
+    results = [None] * len(repo_paths)
+    stats = [{} for _ in repo_paths]
+    errors = []
+
+    def run(index):
+        try:
+            results[index] = list(parser.iter_parse_repository(repo_paths[index], None, stats[index]))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(len(repo_paths))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(JOIN_TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "parsing deadlocked"
+    assert not errors
+    return results, stats
+
+
+def file_elements(parsed_files):
+    return [(parsed_file.record.relative_path, parsed_file.elements) for parsed_file in parsed_files]
+
+
+def test_overlapping_batches_share_parses(tmp_path):
+    repo_paths = [make_repository(tmp_path / name, name) for name in ("first", "second")]
+    # Batches of four files, so each run claims three batches alongside the other's
+    parser = RendezvousParser(2, chunk_size=1, cache=ParseCache(tmp_path / "cache.sqlite"))
+
+    results, stats = parse_concurrently(parser, repo_paths)
+
+    for repo_path, parsed_files in zip(repo_paths, results):
+        assert file_elements(parsed_files) == file_elements(CodeParser().iter_parse_repository(repo_path))
+    # Each shared module is parsed by one run and taken by the other
+    assert sum(run_stats["shared"] for run_stats in stats) == 8
+    assert sum(run_stats["misses"] for run_stats in stats) == 8 + 4 + 4
+    assert not parser._in_flight
+
+
+def test_abandoned_batch_releases_its_claims(tmp_path):
+    repo_paths = [make_repository(tmp_path / name, name) for name in ("first", "second")]
+    parser = ClaimCountingParser(chunk_size=1, cache=ParseCache(tmp_path / "cache.sqlite"))
+
+    # The first run claims its first batch and publishes only the first file of it
+    abandoned = parser.iter_parse_repository(repo_paths[0])
+    next(abandoned)
+    parser.wait_for_claims(1)
+
+    # The second run takes the three shared files of that batch from it, then
+    # blocks on the unpublished ones until the first run stops, as a cancelled job does
+    stats = {}
+    parsed_files = []
+    thread = threading.Thread(
+        target=lambda: parsed_files.extend(parser.iter_parse_repository(repo_paths[1], None, stats)), daemon=True
+    )
+    thread.start()
+    parser.wait_for_claims(2)
+    abandoned.close()
+    thread.join(JOIN_TIMEOUT)
+
+    assert not thread.is_alive(), "waiting on an abandoned claim deadlocked"
+    assert file_elements(parsed_files) == file_elements(CodeParser().iter_parse_repository(repo_paths[1]))
+    assert stats["shared"] == 3
+    assert not parser._in_flight
+
+
+
+def parse_single_file(root, content: bytes):
+    """The ParsedFile of a repository holding only module.py"""
+    root.mkdir()
+    (root / "module.py").write_bytes(content)
+    [parsed_file] = CodeParser().iter_parse_repository(str(root))
+    return parsed_file
+
+
+def test_byte_order_mark_parses_with_ast(tmp_path):
+    parsed_file = parse_single_file(tmp_path / "repo", b'\xef\xbb\xbfimport os\n\ndef run():\n    """Run it"""\n')
+
+    assert [element['name'] for element in parsed_file.elements] == ["run"]
+    # Only the ast parser records references; the regex fallback leaves them empty
+    assert parsed_file.references['imports'] == [["os", 1]]
+
+
+def test_coding_cookie_decodes_source(tmp_path):
+    content = '# -*- coding: latin-1 -*-\ndef menu():\n    """Café"""\n'.encode('latin-1')
+    parsed_file = parse_single_file(tmp_path / "repo", content)
+
+    assert [element['docstring'] for element in parsed_file.elements] == ["Café"]
+    assert parsed_file.elements[0]['code_span'] == [len(b'# -*- coding: latin-1 -*-\n'), len(content) - 1]
@@ -0,0 +1,131 @@
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from services.file_classifier import (
+    BINARY, GENERATED, SOURCE, VENDORED, GitRules, classify_path, git_category, git_ignored
+)
+from services.file_walker import walk_repository
+
+
+@pytest.mark.parametrize("pattern, path, is_dir, ignored", [
+    # No slash: the name at any depth
+    ("*.o", "main.o", False, True),
+    ("*.o", "src/lib/main.o", False, True),
+    ("*.o", "main.c", False, None),
+    ("cache", "a/b/cache", True, True),
+    # A leading or inner slash anchors to the directory of the .gitignore
+    ("/build", "build", True, True),
+    ("/build", "src/build", True, None),
+    ("doc/*.txt", "doc/notes.txt", False, True),
+    ("doc/*.txt", "doc/api/notes.txt", False, None),
+    ("doc/*.txt", "src/doc/notes.txt", False, None),
+    # A trailing slash matches directories only
+    ("logs/", "logs", True, True),
+    ("logs/", "logs", False, None),
+    # ** spans directories
+    ("**/tmp", "tmp", True, True),
+    ("**/tmp", "a/b/tmp", True, True),
+    ("a/**/b", "a/b", True, True),
+    ("a/**/b", "a/x/y/b", True, True),
+    ("out/**", "out/x/y.js", False, True),
+    ("out/**", "out", True, None),
+    # * and ? stop at a slash
+    ("src/*.py", "src/pkg/mod.py", False, None),
+    ("?.py", "a.py", False, True),
+    ("?.py", "ab.py", False, None),
+    # Character classes, negated with !
+    ("[ab].py", "a.py", False, True),
+    ("[ab].py", "c.py", False, None),
+    ("[!ab].py", "c.py", False, True),
+    # Escapes, comments and trailing spaces
+    ("\\#notes", "#notes", False, True),
+    ("# comment", "# comment", False, None),
+    ("*.bak   ", "x.bak", False, True),
+    # Regex metacharacters are literal
+    ("a+b.(c)", "a+b.(c)", False, True),
+    ("a+b.(c)", "aab.(c)", False, None),
+    # Several wildcards, matched without regex backtracking
+    ("**/**/tmp", "a/b/tmp", True, True),
+    ("a/**/*.py", "a/x/y/m.py", False, True),
+    ("a/**/*.py", "a/x/y/m.pyc", False, None),
+    ("*-[0-9]*.log", "app-2.log", False, True),
+    ("*-[0-9]*.log", "app-x.log", False, None),
+    ("***/x", "a/b/x", False, True),
+])
+def test_ignore_pattern(pattern, path, is_dir, ignored):
+    assert GitRules('', [pattern]).ignored(path, is_dir) is ignored
+
+
+def test_hostile_patterns_match_in_linear_time():
+    deep = "/".join("a" * 16) + "/zy"
+    name = "a" * 40
+    started = time.perf_counter()
+    assert GitRules('', ["**/" * 16 + "zz"]).ignored(deep, False) is None
+    assert GitRules('', ["*a" * 10 + "b"]).ignored(name, False) is None
+    assert GitRules('', ["*a" * 10]).ignored(name, False) is True
+    assert time.perf_counter() - started < 1
+
+
+def test_last_matching_pattern_wins():
+    rules = GitRules('', ["*.js", "!keep.js", "vendor/keep.js"])
+    assert rules.ignored("app.js", False) is True
+    assert rules.ignored("keep.js", False) is False
+    assert rules.ignored("vendor/keep.js", False) is True
+
+
+def test_nested_rules_are_relative_and_override_parents():
+    rules = (GitRules('', ["*.gen.py"]), GitRules('pkg', ["/local", "!keep.gen.py"]))
+    assert git_ignored(rules, "pkg/local", True)
+    assert not git_ignored(rules, "local", True)
+    assert not git_ignored(rules, "pkg/sub/local", True)
+    assert not git_ignored(rules, "pkg/keep.gen.py", False)
+    assert git_ignored(rules, "pkg/other.gen.py", False)
+    assert git_ignored(rules, "keep.gen.py", False)
+
+
+def test_attributes_set_and_unset_categories():
+    rules = (
+        GitRules('', attribute_lines=["*.pb.py linguist-generated", "third/** linguist-vendored", "*.dat binary"]),
+        GitRules('web', attribute_lines=["dist/** -linguist-generated", "api.pb.py linguist-generated=false"]),
+    )
+
+    def category(path):
+        return git_category(rules, path, classify_path(path))
+
+    assert category("schema.pb.py") == GENERATED
+    assert category("third/lib/mod.py") == VENDORED
+    assert category("blob.dat") == BINARY
+    # Explicitly unset in a nested file, overriding the parent's attribute and the dist/ heuristic
+    assert category("web/api.pb.py") == SOURCE
+    assert category("web/dist/app.js") == SOURCE
+    assert category("dist/app.js") == GENERATED
+    assert category("src/app.py") == SOURCE
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+def test_walk_matches_git(tmp_path):
+    ignores = {
+        ".gitignore": "*.o\n/build/\ndocs/*.txt\n!docs/keep.txt\n**/cache/\nout/**\n[Tt]emp*\n\\#*\n",
+        "src/.gitignore": "/local.py\ngenerated/\n!*.o\n",
+        "src/deep/.gitignore": "*\n!*.py\n!.gitignore\n",
+    }
+    files = [
+        "main.py", "main.o", "build/x.py", "src/build/x.py", "docs/a.txt", "docs/keep.txt", "docs/api/a.txt",
+        "cache/x.py", "src/cache/x.py", "out/x.js", "out/sub/y.js", "Temp.py", "temporary.py", "#draft.py",
+        "src/local.py", "src/pkg/local.py", "src/generated/x.py", "src/lib.o", "src/deep/a.py", "src/deep/a.js",
+    ]
+    for path, text in ignores.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    for path in files:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("x = 1\n")
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+
+    listed = subprocess.run(
+        ["git", "ls-files", "--others", "--exclude-standard"], cwd=tmp_path, capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert sorted(record.relative_path for record in walk_repository(tmp_path)) == sorted(listed)
@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from parsers.js_scanner import scan_js_source
+
+
+def scan_references(content: str):
+    references = {'imports': [], 'references': []}
+    scan_js_source(content, "module.js", references=references)
+    return references
+
+
+@pytest.mark.parametrize("content, specifier, names", [
+    ("import React, { useState as s } from 'react';", "react", ["React", "useState"]),
+    ("import * as path from \"path\";", "path", []),
+    ("import type { Props } from './props';", "./props", ["Props"]),
+    ("export { a,\n  b } from './ab';", "./ab", ["a", "b"]),
+    ("export * from './all';", "./all", []),
+    ("import x from'x';", "x", ["x"]),
+    ("import './side-effect';", "./side-effect", []),
+    ("const fs = require('fs');", "fs", []),
+])
+def test_import_specifiers_and_names(content, specifier, names):
+    references = scan_references(content)
+    assert references['imports'] == [[specifier, 1]]
+    assert [name for name, _, kind in references['references'] if kind == 'import'] == names
+
+
+def test_import_followed_by_whitespace_scans_in_linear_time():
+    started = time.perf_counter()
+    references = scan_references("import" + "\n" * 20000)
+    assert references['imports'] == []
+    assert time.perf_counter() - started < 1
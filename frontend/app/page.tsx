@@ -22,7 +22,7 @@ interface CodeElement {
   file_path: string;
   start_line: number;
   end_line: number;
-  code: string;
+  code?: string;
   docstring: string;
   language: string;
 }
@@ -34,6 +34,8 @@ export default function Home() {
   const [searchQuery, setSearchQuery] = useState('');
   const [searchResults, setSearchResults] = useState<CodeElement[]>([]);
   const [searching, setSearching] = useState(false);
+  // Snippets of expanded results, fetched on demand by result index
+  const [snippets, setSnippets] = useState<Record<number, string>>({});
   const [aiQuestion, setAiQuestion] = useState('');
   const [aiResponse, setAiResponse] = useState('');
   const [aiLoading, setAiLoading] = useState(false);
@@ -120,6 +122,7 @@ export default function Home() {
       );
       const data = await response.json();
       setSearchResults(data.results || []);
+      setSnippets({});
     } catch (error) {
       console.error('Search error:', error);
       setSearchResults([]);
@@ -127,6 +130,25 @@ export default function Home() {
     setSearching(false);
   };
 
+  const showSnippet = async (index: number, element: CodeElement) => {
+    if (!repository || snippets[index] !== undefined) return;
+    
+    try {
+      const params = new URLSearchParams({
+        path: element.file_path,
+        start_line: String(element.start_line),
+        end_line: String(element.end_line),
+      });
+      const response = await fetch(
+        `http://localhost:8000/repositories/${repository.id}/snippet?${params}`
+      );
+      const data = await response.json();
+      setSnippets(prev => ({ ...prev, [index]: data.code ?? '' }));
+    } catch (error) {
+      console.error('Snippet error:', error);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-gray-50 py-12 px-4">
       <div className="max-w-4xl mx-auto">
@@ -286,9 +308,19 @@ export default function Home() {
                         </p>
                       )}
                       
-                      <pre className="bg-gray-800 text-green-400 p-3 rounded text-sm overflow-x-auto">
-                        <code>{element.code?.slice(0, 300) || 'No code preview available'}...</code>
-                      </pre>
+                      {snippets[index] !== undefined ? (
+                        <pre className="bg-gray-800 text-green-400 p-3 rounded text-sm overflow-x-auto">
+                          <code>{snippets[index] || 'No code preview available'}</code>
+                        </pre>
+                      ) : (
+                        <button
+                          type="button"
+                          onClick={() => showSnippet(index, element)}
+                          className="text-sm text-blue-600 hover:underline"
+                        >
+                          Show code (lines {element.start_line}-{element.end_line})
+                        </button>
+                      )}
                     </div>
                   ))}
                 </div>